@@ -1,12 +1,46 @@
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, send_file
+from flask import Flask, Request, render_template, request, redirect, url_for, send_from_directory, flash, send_file, Response, stream_with_context, g
 import os
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 import requests
 import base64
 import json
 from datetime import datetime
-from PIL import Image
+from PIL import Image, ImageOps, features
 import io
+import threading
+import tempfile
+import atexit
+import sqlite3
+import functools
+import contextlib
+import heapq
+import itertools
+import hashlib
+import time
+import random
+import shutil
+import multiprocessing
+import uuid
+import zipfile
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single server process, so metadata needs no cross-process lock
+    fcntl = None
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # Only needed when REMOTE_STORAGE = 's3' (requirements-s3.txt)
+    boto3 = TransferConfig = None
+
+    class ClientError(Exception):
+        """Stands in for botocore's so handlers still resolve; never raised without boto3"""
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
@@ -14,86 +48,1137 @@ app.secret_key = 'your-secret-key-here'
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'py','txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'zip', 'rar', 'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv'}
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv'}
+MAX_VIDEO_SIZE = 30 * 1024 * 1024  # 30MB in bytes
+# Already-compressed formats stored in ZIP downloads as they are instead of deflated again
+ZIP_STORED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'docx', 'xlsx', 'zip', 'rar', 'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv'}
+ZIP_CHUNK_SIZE = 64 * 1024  # Bytes read from each file between writes to a streamed ZIP
 
 # GitHub Configuration - Update these with your details
 GITHUB_REPO = 'aalvincris03/upload'  # e.g., 'johnsmith/my-files'
 GITHUB_TOKEN = ''  # Get from https://github.com/settings/tokens
 GITHUB_BRANCH = 'main'  # or 'master'
+GITHUB_LISTING_TTL = 60  # Seconds to reuse the GitHub file listing before revalidating it
+GITHUB_API_URL = 'https://api.github.com'
+GITHUB_TIMEOUT = (5, 60)  # Connect and read timeouts in seconds for each GitHub call
+GITHUB_MAX_RETRIES = 4  # Retries for server errors and rate limiting
+GITHUB_MAX_RETRY_WAIT = 60  # Longest wait in seconds before giving up on a retry
+GITHUB_POOL_SIZE = 10  # Keep-alive connections kept open per host
+GITHUB_BATCH_COMMITS = True  # Push multi-file uploads and syncs as one commit via the Git Data API
+GITHUB_BATCH_SIZE = 100  # Most queued files to push in a single commit
+GITHUB_BLOB_WORKERS = 8  # Parallel blob uploads in a batch commit
+GITHUB_BATCH_WINDOW = 1.0  # Seconds to collect queued files before pushing them together
+GITHUB_DOWNLOAD_WORKERS = 4  # Parallel downloads from GitHub; kept low to stay under rate limits
+GITHUB_DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes written to disk at a time while downloading
+
+# Remote copy of the uploads, used by the job queue, sync and the file views: 'github' (the
+# uploads/ folder of GITHUB_REPO) or 's3' (any S3-compatible object store such as AWS S3 or
+# MinIO; needs boto3, see requirements-s3.txt). S3 takes large media in multipart uploads,
+# past the ~100MB GitHub allows.
+REMOTE_STORAGE = 'github'
+REMOTE_STREAM_CHUNK_SIZE = 64 * 1024  # Bytes passed on at a time when serving a file straight from remote storage
+S3_BUCKET = ''
+S3_PREFIX = 'uploads/'
+S3_ENDPOINT_URL = None  # e.g. 'http://localhost:9000' for MinIO, None for AWS; credentials come from the usual AWS settings
+S3_REGION = None
+S3_LISTING_TTL = 60  # Seconds to reuse the bucket listing
+S3_MULTIPART_THRESHOLD = 64 * 1024 * 1024  # Files this large are uploaded in parts
+S3_MULTIPART_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Background GitHub mirroring: uploads return as soon as the local write is done
+# and a queue persisted in SQLite pushes the files to GitHub
+JOBS_DB = os.path.join(app.instance_path, 'jobs.db')
+GITHUB_JOB_WORKERS = 2
+GITHUB_JOB_MAX_ATTEMPTS = 5
+GITHUB_JOB_RETRY_DELAY = 30  # Seconds before the first retry, doubled on each attempt
+GITHUB_JOB_POLL_INTERVAL = 5
+GITHUB_JOB_STALE_AFTER = 600  # Requeue jobs left running this long by a crashed worker
+GITHUB_JOB_STATUS_BATCH = 500  # File names per job status query, within SQLite's bound parameter limit
+
+# Last-synced blob SHAs per file, so syncs only transfer files whose content changed
+SYNC_MANIFEST = os.path.join(app.instance_path, 'sync_manifest.json')
 
 # Create upload folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Local layout: 'flat' keeps every upload directly in UPLOAD_FOLDER, 'sharded' spreads them
+# over UPLOAD_FOLDER/files/00..ff by a hash of the name so no folder grows huge.
+# Run `flask migrate-uploads` after changing it to move the existing files.
+UPLOAD_LAYOUT = 'flat'
+UPLOAD_SHARD_FOLDER = os.path.join(UPLOAD_FOLDER, 'files')
+
+# Uploads are streamed here while the request is read, then moved into UPLOAD_FOLDER
+INCOMING_FOLDER = os.path.join(app.instance_path, 'incoming')
+# Content-addressed store: one blob per SHA-256 digest, hard-linked into UPLOAD_FOLDER under each name
+OBJECTS_FOLDER = os.path.join(app.instance_path, 'objects')
+
 # Metadata file for tracking upload timestamps
 METADATA_FILE = os.path.join(UPLOAD_FOLDER, 'metadata.json')
-
-def load_metadata():
-    """Load upload metadata from JSON file"""
-    if os.path.exists(METADATA_FILE):
+# Metadata backend: 'json' (metadata.json) or 'sqlite' (indexed database used for sorted listings)
+METADATA_BACKEND = 'json'
+METADATA_DB = os.path.join(app.instance_path, 'metadata.db')
+# Seconds to wait after a change before writing metadata to disk, so a batch
+# of uploads is written once instead of once per file
+METADATA_FLUSH_INTERVAL = 2.0
+# Worker processes (e.g. several gunicorn workers) share JSON metadata through an append-only
+# change log: a flush appends the changed entries under a file lock, every worker replays what
+# the others appended, and the log is folded into metadata.json once it grows past the limit
+METADATA_LOG = os.path.join(app.instance_path, 'metadata.log')
+METADATA_LOCK_FILE = os.path.join(app.instance_path, 'metadata.lock')
+METADATA_LOG_COMPACT_SIZE = 1024 * 1024  # 1MB
+METADATA_RELOAD_INTERVAL = 1.0  # Seconds between checks for metadata written by other processes
+
+# Thumbnails for image cards, cached on disk by content hash and size
+THUMBNAIL_FOLDER = os.path.join(app.instance_path, 'thumbnails')
+THUMBNAIL_SIZES = (160, 320, 640)
+THUMBNAIL_DEFAULT_SIZE = 320
+THUMBNAIL_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'bmp'}
+
+# Image conversion: Pillow format and save options for each supported target format
+IMAGE_SAVE_FORMATS = {
+    'jpg': ('JPEG', {'quality': 95}),
+    'jpeg': ('JPEG', {'quality': 95}),
+    'png': ('PNG', {}),
+    'bmp': ('BMP', {}),
+    'tiff': ('TIFF', {}),
+    'webp': ('WEBP', {}),
+    'gif': ('GIF', {}),
+}
+# Encode presets layered over those defaults: per-format save options, a longest-side limit,
+# and whether to strip metadata (True), keep it (False) or leave it to Pillow (None)
+CONVERSION_PRESETS = {
+    'default': {
+        'label': 'Default (JPEG quality 95)',
+    },
+    'web': {
+        'label': 'Web: max 2048px, quality 80, metadata stripped',
+        'max_size': 2048,
+        'strip_metadata': True,
+        'formats': {
+            'JPEG': {'quality': 80, 'optimize': True, 'progressive': True},
+            'WEBP': {'quality': 80, 'method': 4},
+            'PNG': {'optimize': True},
+        },
+    },
+    'archive': {
+        'label': 'Archive: lossless where the format allows, metadata kept',
+        'strip_metadata': False,
+        'formats': {
+            'JPEG': {'quality': 100, 'subsampling': 0},
+            'WEBP': {'lossless': True, 'quality': 100, 'method': 6},
+            'PNG': {'optimize': True},
+            'TIFF': {'compression': 'tiff_lzw'},
+        },
+    },
+    'fast': {
+        'label': 'Fast: lowest encoder effort',
+        'formats': {
+            'JPEG': {'quality': 85},
+            'WEBP': {'quality': 80, 'method': 0},
+            'PNG': {'compress_level': 1},
+        },
+    },
+}
+DEFAULT_CONVERSION_PRESET = 'default'
+# Largest image decoded, bounding a worker's memory at about 4 bytes per pixel (256MB).
+# Also Pillow's decompression-bomb threshold, but Pillow only warns up to twice this,
+# so every decode path checks the size itself before loading any pixels
+IMAGE_MAX_PIXELS = 64 * 1024 * 1024
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+CONVERSION_WORKERS = None  # Processes converting images in parallel; None uses every core
+CONVERSION_JOB_STALE_AFTER = 600  # Report a job as interrupted once it has made no progress for this long
+# Converted outputs cached by source digest and encode settings, evicted least recently used first
+CONVERSION_CACHE_FOLDER = os.path.join(app.instance_path, 'conversions')
+CONVERSION_CACHE_BUDGET = 512 * 1024 * 1024  # 512MB
+
+# Process-wide metadata store: loaded once, changed in place, flushed in batches
+_metadata = None
+_metadata_dirty = False
+_metadata_changed = set()  # Filenames changed since the last flush (None = everything)
+_metadata_timer = None
+_metadata_lock = threading.RLock()
+_metadata_flush_lock = threading.Lock()
+_metadata_source = None  # What the store was read from, compared to notice other processes' writes
+_metadata_checked_at = 0.0
+_metadata_watch_conn = None  # Kept open so PRAGMA data_version reports other connections' commits
+
+# Sort modes for the file listing as (column, descending) pairs, with the file
+# name as tiebreak. Missing values always sort last, in both directions.
+SORT_MODES = {
+    'name_asc': [('name_lower', False), ('name', False)],
+    'name_desc': [('name_lower', True), ('name', True)],
+    'time_newest': [('upload_time', True), ('name', False)],
+    'time_oldest': [('upload_time', False), ('name', False)],
+    'size_largest': [('size', True), ('name', False)],
+    'size_smallest': [('size', False), ('name', False)],
+    'type_asc': [('extension', False), ('name', False)],
+    'type_desc': [('extension', True), ('name', False)],
+}
+# Types a cursor may hold for each sort column, None included where the column is nullable
+SORT_COLUMN_TYPES = {
+    'name': (str,),
+    'name_lower': (str,),
+    'extension': (str,),
+    'upload_time': (str, type(None)),
+    'size': (int, type(None)),
+}
+# Re-list the upload folder if it changed this recently, since a second change
+# within the same mtime tick would not move the directory's mtime again
+LOCAL_LISTING_RESCAN_WINDOW = 2.0
+# Number of files per page in the /files listing and the /api/files endpoint
+PAGE_SIZE = 60
+MAX_PAGE_SIZE = 500
+
+# Histogram buckets in seconds for the latencies exported by /metrics
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Metric families exported by /metrics, in registration order
+_metrics = []
+
+class Metric:
+    """A metric family in the Prometheus text format, with one series per combination of label values
+
+    Values live in this process only; with several server processes each one
+    reports its own numbers.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        escape = lambda value: value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+    def _samples(self, key, value):
+        yield f'{self.name}{self._format_labels(key)} {value}'
+
+    def render(self):
+        """Return the family's HELP, TYPE and sample lines"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            series = sorted(self._series.items())
+            for key, value in series:
+                lines.extend(self._samples(key, value))
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            # Counts are kept per bucket and made cumulative when rendered
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe how long the with block takes"""
+        started = time.perf_counter()
         try:
-            with open(METADATA_FILE, 'r') as f:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self, key, value):
+        counts, total, count = value
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            yield f'{self.name}_bucket{self._format_labels(key, [("le", repr(float(bound)))])} {cumulative}'
+        yield f'{self.name}_bucket{self._format_labels(key, [("le", "+Inf")])} {count}'
+        yield f'{self.name}_sum{self._format_labels(key)} {total}'
+        yield f'{self.name}_count{self._format_labels(key)} {count}'
+
+def render_metrics():
+    """Return every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+HTTP_REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Time to handle a request, by endpoint',
+                                 ('endpoint', 'method', 'status'))
+GITHUB_REQUEST_SECONDS = Histogram('github_request_duration_seconds',
+                                   'Time until GitHub responds to an API call, per attempt, by operation',
+                                   ('method', 'operation', 'status'))
+GITHUB_RATE_LIMIT_REMAINING = Gauge('github_rate_limit_remaining', 'GitHub API requests left in the current rate limit window')
+GITHUB_RATE_LIMIT_RESET = Gauge('github_rate_limit_reset_timestamp_seconds', 'Unix time the GitHub rate limit window resets')
+CONVERSION_SECONDS = Histogram('image_conversion_duration_seconds', 'Time to convert one image, by source and target format',
+                               ('source_format', 'target_format'))
+PROCESSED_BYTES = Counter('processed_bytes_total', 'Bytes received, transferred or converted, by operation', ('operation',))
+METADATA_FLUSH_SECONDS = Histogram('metadata_flush_duration_seconds', 'Time to write pending metadata changes, by backend',
+                                   ('backend',))
+
+def get_extension(filename):
+    """Return the lowercase extension of a filename, or '' if it has none"""
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+def _parse_metadata_entry(metadata):
+    """Convert an entry's upload_time string back to a datetime object"""
+    if 'upload_time' in metadata and metadata['upload_time']:
+        try:
+            metadata['upload_time'] = datetime.fromisoformat(metadata['upload_time'])
+        except (ValueError, TypeError):
+            metadata['upload_time'] = None
+    return metadata
+
+def _read_metadata_file(path=METADATA_FILE):
+    """Read upload metadata from JSON file"""
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
                 data = json.load(f)
-                # Convert upload_time strings back to datetime objects
-                for filename, metadata in data.items():
-                    if 'upload_time' in metadata and metadata['upload_time']:
-                        try:
-                            metadata['upload_time'] = datetime.fromisoformat(metadata['upload_time'])
-                        except (ValueError, TypeError):
-                            metadata['upload_time'] = None
+                for metadata in data.values():
+                    _parse_metadata_entry(metadata)
                 return data
         except:
             return {}
     return {}
 
-def save_metadata(metadata):
-    """Save upload metadata to JSON file"""
-    with open(METADATA_FILE, 'w') as f:
-        json.dump(metadata, f, indent=2, default=str)
+@contextlib.contextmanager
+def metadata_file_lock(shared=False):
+    """Hold the advisory lock every process takes before touching metadata.json or the change log"""
+    os.makedirs(os.path.dirname(METADATA_LOCK_FILE), exist_ok=True)
+    with open(METADATA_LOCK_FILE, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+
+def _file_identity(path):
+    """Return (inode, mtime, size) for a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def _read_metadata_log(offset=0, inode=None):
+    """Read change log records from offset as [(filename, entry or None if deleted)]
+
+    Returns the records and the offset after the last complete one, or None if
+    the log is no longer the file with the given inode (it was compacted).
+    """
+    try:
+        with open(METADATA_LOG, 'rb') as f:
+            if inode is not None and os.fstat(f.fileno()).st_ino != inode:
+                return None
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return None if inode is not None else ([], 0)
+
+    # A record still being appended has no newline yet and is read next time
+    end = data.rfind(b'\n') + 1
+    changes = []
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue  # Left incomplete by a crashed writer
+        changes.append((record['name'], _parse_metadata_entry(record['entry']) if record['entry'] else None))
+    return changes, offset + end
+
+def _read_metadata_json():
+    """Read metadata.json plus the change log; the caller holds the metadata file lock"""
+    data = _read_metadata_file()
+    log = _file_identity(METADATA_LOG)
+    changes, offset = _read_metadata_log()
+    for filename, entry in changes:
+        if entry is None:
+            data.pop(filename, None)
+        else:
+            data[filename] = entry
+    return data, (_file_identity(METADATA_FILE), log[0] if log else None, offset)
+
+def _metadata_row(filename, entry):
+    """Build the sortable column values for a metadata entry"""
+    upload_time = entry.get('upload_time') if entry else None
+    return {
+        'name': filename,
+        'name_lower': filename.lower(),
+        'upload_time': upload_time.isoformat(sep=' ', timespec='microseconds') if upload_time else None,
+        'size': entry.get('size') if entry else None,
+        'extension': get_extension(filename),
+        'sha256': entry.get('sha256') if entry else None
+    }
+
+def _connect_metadata_db():
+    """Open the SQLite metadata database, creating the schema if needed"""
+    os.makedirs(os.path.dirname(METADATA_DB), exist_ok=True)
+    conn = sqlite3.connect(METADATA_DB, timeout=30)
+    # WAL lets every worker process read while one of them writes
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS files (
+            name TEXT PRIMARY KEY,
+            name_lower TEXT NOT NULL,
+            upload_time TEXT,
+            size INTEGER,
+            extension TEXT NOT NULL,
+            sha256 TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_files_name_lower ON files (name_lower, name);
+        CREATE INDEX IF NOT EXISTS idx_files_upload_time ON files (upload_time, name);
+        CREATE INDEX IF NOT EXISTS idx_files_size ON files (size, name);
+        CREATE INDEX IF NOT EXISTS idx_files_extension ON files (extension, name);
+    ''')
+    # Databases created before content digests were recorded lack the column
+    if 'sha256' not in {row[1] for row in conn.execute('PRAGMA table_info(files)')}:
+        conn.execute('ALTER TABLE files ADD COLUMN sha256 TEXT')
+    return conn
+
+def _write_metadata_rows(conn, metadata, filenames):
+    """Upsert (or delete, if no longer present) the given filenames in the database"""
+    rows = []
+    for filename in filenames:
+        if filename in metadata:
+            rows.append(_metadata_row(filename, metadata[filename]))
+        else:
+            conn.execute('DELETE FROM files WHERE name = ?', (filename,))
+    conn.executemany('''
+        INSERT INTO files (name, name_lower, upload_time, size, extension, sha256)
+        VALUES (:name, :name_lower, :upload_time, :size, :extension, :sha256)
+        ON CONFLICT(name) DO UPDATE SET
+            name_lower = excluded.name_lower,
+            upload_time = excluded.upload_time,
+            size = excluded.size,
+            extension = excluded.extension,
+            sha256 = excluded.sha256
+    ''', rows)
+
+def import_metadata_json(path=METADATA_FILE):
+    """Import entries from a metadata.json file into the SQLite database"""
+    data = _read_metadata_file(path)
+    conn = _connect_metadata_db()
+    try:
+        with conn:
+            _write_metadata_rows(conn, data, data.keys())
+    finally:
+        conn.close()
+    return len(data)
+
+def _read_metadata():
+    """Read upload metadata from the configured backend, returning it with a marker of what was read"""
+    global _metadata_watch_conn
+    if METADATA_BACKEND != 'sqlite':
+        with metadata_file_lock(shared=True):
+            return _read_metadata_json()
+
+    conn = _connect_metadata_db()
+    if _metadata_watch_conn is None:
+        _metadata_watch_conn = sqlite3.connect(METADATA_DB, check_same_thread=False)
+    # Taken before reading, so a commit made meanwhile shows up as a change on the next check
+    data_version = _metadata_watch_conn.execute('PRAGMA data_version').fetchone()[0]
+    try:
+        # Migrate an existing metadata.json the first time the database is used
+        if conn.execute('SELECT COUNT(*) FROM files').fetchone()[0] == 0 and os.path.exists(METADATA_FILE):
+            print(f"Imported {import_metadata_json()} metadata entries from {METADATA_FILE}")
+
+        data = {}
+        for name, upload_time, size, sha256 in conn.execute('SELECT name, upload_time, size, sha256 FROM files'):
+            try:
+                upload_time = datetime.fromisoformat(upload_time) if upload_time else None
+            except ValueError:
+                upload_time = None
+            data[name] = {'upload_time': upload_time, 'size': size, 'sha256': sha256}
+        return data, data_version
+    finally:
+        conn.close()
+
+def _merge_metadata(changes):
+    """Apply (filename, entry or None) changes read from disk, keeping this process's unflushed ones"""
+    for filename, entry in changes:
+        if filename in _metadata_changed:
+            continue
+        if entry is None:
+            _metadata.pop(filename, None)
+        elif _metadata.get(filename) != entry:
+            _metadata[filename] = entry
+
+def _refresh_metadata():
+    """Pick up metadata other processes have written since the store was read"""
+    global _metadata_source
+    if _metadata_changed is None:
+        return  # The whole store is about to be written out
+
+    if METADATA_BACKEND == 'sqlite':
+        if _metadata_watch_conn.execute('PRAGMA data_version').fetchone()[0] == _metadata_source:
+            return
+    else:
+        snapshot, log_inode, offset = _metadata_source
+        log = _file_identity(METADATA_LOG)
+        if log and _file_identity(METADATA_FILE) == snapshot and log[0] == log_inode and log[2] >= offset:
+            if log[2] == offset:
+                return
+            # Only new records were appended: replay them
+            result = _read_metadata_log(offset, log_inode)
+            if result is not None:
+                changes, offset = result
+                _merge_metadata(changes)
+                _metadata_source = (snapshot, log_inode, offset)
+                return
+        elif log is None and log_inode is None and _file_identity(METADATA_FILE) == snapshot:
+            return
+
+    # Compacted, cleared or rewritten elsewhere: read everything and apply the differences
+    data, _metadata_source = _read_metadata()
+    _merge_metadata([(filename, None) for filename in _metadata if filename not in data])
+    _merge_metadata(data.items())
+
+def load_metadata():
+    """Return the in-memory metadata store, loading it on first use and then following other processes' writes"""
+    global _metadata, _metadata_source, _metadata_checked_at
+    with _metadata_lock:
+        if _metadata is None:
+            _metadata, _metadata_source = _read_metadata()
+            _metadata_checked_at = time.monotonic()
+        elif time.monotonic() - _metadata_checked_at >= METADATA_RELOAD_INTERVAL:
+            _metadata_checked_at = time.monotonic()
+            _refresh_metadata()
+        return _metadata
+
+def save_metadata(metadata=None, changed=None):
+    """Mark metadata as changed and schedule a batched flush to disk
+
+    changed lists the filenames that were modified; without it the whole store
+    is written on the next flush.
+    """
+    global _metadata, _metadata_dirty, _metadata_changed, _metadata_timer
+    with _metadata_lock:
+        if metadata is not None:
+            _metadata = metadata
+        if changed is None or metadata is not None:
+            _metadata_changed = None
+        elif _metadata_changed is not None:
+            _metadata_changed.update(changed)
+        _metadata_dirty = True
+        if _metadata_timer is None:
+            _metadata_timer = threading.Timer(METADATA_FLUSH_INTERVAL, flush_metadata)
+            _metadata_timer.daemon = True
+            _metadata_timer.start()
+
+def flush_metadata():
+    """Write pending metadata changes to disk"""
+    global _metadata_dirty, _metadata_changed, _metadata_timer
+    with _metadata_flush_lock:
+        with _metadata_lock:
+            if _metadata_timer is not None:
+                _metadata_timer.cancel()
+                _metadata_timer = None
+            if not _metadata_dirty:
+                return
+            # Entries are replaced rather than mutated, so a shallow copy is a stable snapshot
+            snapshot = dict(_metadata)
+            changed = _metadata_changed
+            _metadata_dirty = False
+            _metadata_changed = set()
+
+        try:
+            with METADATA_FLUSH_SECONDS.time(backend=METADATA_BACKEND):
+                if METADATA_BACKEND == 'sqlite':
+                    _flush_metadata_db(snapshot, changed)
+                else:
+                    _flush_metadata_log(snapshot, changed)
+        except Exception as e:
+            print(f"Metadata flush error: {e}")
+            save_metadata(changed=changed)  # Retry on the next flush
+
+def _flush_metadata_file(snapshot):
+    """Rewrite metadata.json with an atomic write-then-rename"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(METADATA_FILE) or '.', prefix='.metadata-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f, indent=2, default=str)
+        os.replace(tmp_path, METADATA_FILE)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _compact_metadata_log(data):
+    """Write data as metadata.json and start an empty change log; the caller holds the file lock"""
+    _flush_metadata_file(data)
+    # A crash between the two steps only leaves records that metadata.json already includes
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(METADATA_LOG), prefix='.metadata-log-', suffix='.tmp')
+    os.close(fd)
+    os.replace(tmp_path, METADATA_LOG)
+
+def _flush_metadata_log(snapshot, changed):
+    """Append changed entries to the change log under the file lock, compacting it once it is large"""
+    os.makedirs(os.path.dirname(METADATA_LOG), exist_ok=True)
+    with metadata_file_lock():
+        if changed is None:
+            _compact_metadata_log(snapshot)
+            return
+
+        records = ''.join(json.dumps({'name': filename, 'entry': snapshot.get(filename)}, default=str) + '\n'
+                          for filename in changed).encode('utf-8')
+        with open(METADATA_LOG, 'a+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                # End a record cut short by a crashed writer so it cannot swallow this one
+                f.seek(size - 1)
+                if f.read(1) != b'\n':
+                    records = b'\n' + records
+            f.write(records)
+            size += len(records)
+
+        if size > METADATA_LOG_COMPACT_SIZE:
+            data, _ = _read_metadata_json()
+            _compact_metadata_log(data)
+
+def _flush_metadata_db(snapshot, changed):
+    """Write changed entries to the SQLite database in one transaction"""
+    conn = _connect_metadata_db()
+    try:
+        with conn:
+            if changed is None:
+                conn.execute('DELETE FROM files')
+                changed = snapshot.keys()
+            _write_metadata_rows(conn, snapshot, changed)
+    finally:
+        conn.close()
+
+atexit.register(flush_metadata)
+
+def record_file_metadata(filename, file_path, digest=None):
+    """Record upload timestamp, size and content digest for a file"""
+    metadata = load_metadata()
+    with _metadata_lock:
+        metadata[filename] = {
+            'upload_time': datetime.now(),
+            'size': os.path.getsize(file_path),
+            'sha256': digest
+        }
+        save_metadata(changed=[filename])
+
+def remove_file_metadata(filename):
+    """Remove metadata for a file"""
+    metadata = load_metadata()
+    with _metadata_lock:
+        if filename in metadata:
+            del metadata[filename]
+            save_metadata(changed=[filename])
+
+def clear_metadata():
+    """Remove all metadata, both in memory and on disk"""
+    global _metadata, _metadata_dirty, _metadata_changed, _metadata_timer
+    with _metadata_flush_lock:
+        with _metadata_lock:
+            if _metadata_timer is not None:
+                _metadata_timer.cancel()
+                _metadata_timer = None
+            _metadata = None  # Read again, empty, on next use
+            _metadata_dirty = False
+            _metadata_changed = set()
+            if METADATA_BACKEND == 'sqlite':
+                conn = _connect_metadata_db()
+                try:
+                    with conn:
+                        conn.execute('DELETE FROM files')
+                finally:
+                    conn.close()
+            with metadata_file_lock():
+                for path in (METADATA_FILE, METADATA_LOG):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+def _compare_sort_values(a, b, spec):
+    """Compare two rows' sort values the same way the SQL ORDER BY does"""
+    for (column, descending), x, y in zip(spec, a, b):
+        if x == y:
+            continue
+        if x is None:
+            return 1
+        if y is None:
+            return -1
+        if descending:
+            return -1 if x > y else 1
+        return -1 if x < y else 1
+    return 0
+
+def _keyset_condition(spec, after):
+    """Build a SQL WHERE clause selecting the rows that sort after the given values"""
+    clauses = []
+    params = []
+    for i, (column, descending) in enumerate(spec):
+        parts = []
+        for (prev_column, _), value in zip(spec[:i], after[:i]):
+            if value is None:
+                parts.append(f'{prev_column} IS NULL')
+            else:
+                parts.append(f'{prev_column} = ?')
+                params.append(value)
+        value = after[i]
+        if value is None:
+            continue  # Missing values sort last, so nothing sorts strictly after them
+        parts.append(f"({column} {'<' if descending else '>'} ? OR {column} IS NULL)")
+        params.append(value)
+        clauses.append('(' + ' AND '.join(parts) + ')')
+    return ' OR '.join(clauses) or '0', params
+
+def encode_cursor(values):
+    """Encode a row's sort values as an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, sort_by):
+    """Decode a pagination cursor, returning None if it is invalid for the sort mode"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    spec = SORT_MODES.get(sort_by, [])
+    if not isinstance(values, list) or len(values) != len(spec):
+        return None
+    for (column, _), value in zip(spec, values):
+        if isinstance(value, bool) or not isinstance(value, SORT_COLUMN_TYPES[column]):
+            return None
+    return tuple(values)
+
+def iter_sorted_files(files_info, sort_by, after=None):
+    """Yield (sort_values, name) for files_info in the order of one of the SORT_MODES
+
+    If after is given (the sort values of a previous row), only rows that sort
+    after it are yielded. Unknown sort modes yield files in their original order.
+    """
+    spec = SORT_MODES.get(sort_by)
+    if spec is None:
+        for name in files_info:
+            yield (), name
+        return
+
+    metadata = load_metadata()
+    sort_key = functools.cmp_to_key(lambda a, b: _compare_sort_values(a[0], b[0], spec))
+
+    def rows_for(names):
+        for name in names:
+            # Files without metadata (e.g. GitHub-only) sort by what files_info knows about them
+            row = _metadata_row(name, metadata.get(name) or files_info.get(name))
+            values = tuple(row[column] for column, _ in spec)
+            if after is None or _compare_sort_values(values, after, spec) > 0:
+                yield values, name
+
+    if METADATA_BACKEND != 'sqlite':
+        yield from sorted(rows_for(files_info), key=sort_key)
+        return
+
+    # Files with metadata come pre-sorted from the indexed ORDER BY; the few
+    # without (e.g. GitHub-only files) are sorted here and merged in.
+    flush_metadata()
+    order_by = ', '.join(f"{column} {'DESC' if descending else 'ASC'} NULLS LAST" for column, descending in spec)
+    columns = ', '.join(column for column, _ in spec)
+    where, params = _keyset_condition(spec, after) if after is not None else ('1', [])
+    extra = sorted(rows_for(name for name in files_info if name not in metadata), key=sort_key)
+
+    conn = _connect_metadata_db()
+    try:
+        rows = conn.execute(f'SELECT {columns}, name FROM files WHERE {where} ORDER BY {order_by}', params)
+        indexed = ((tuple(row[:-1]), row[-1]) for row in rows if row[-1] in files_info)
+        yield from heapq.merge(indexed, extra, key=sort_key)
+    finally:
+        conn.close()
+
+def sort_file_names(files_info, sort_by):
+    """Return the names in files_info ordered by one of the SORT_MODES"""
+    return [name for _, name in iter_sorted_files(files_info, sort_by)]
+
+def paginate_files(files_info, sort_by, page=1, limit=None, cursor=None):
+    """Return one page of sorted file names and the cursor for the next page
+
+    Pages are selected either by number (page/limit) or, when a cursor from a
+    previous page is given, by keyset so deep pages cost the same as the first.
+    """
+    limit = min(limit or PAGE_SIZE, MAX_PAGE_SIZE)
+    after = decode_cursor(cursor, sort_by) if cursor else None
+    rows = iter_sorted_files(files_info, sort_by, after=after)
+    if after is None and page > 1:
+        rows = itertools.islice(rows, (page - 1) * limit, None)
+
+    page_rows = list(itertools.islice(rows, limit + 1))
+    has_more = len(page_rows) > limit
+    page_rows = page_rows[:limit]
+    next_cursor = None
+    if has_more and sort_by in SORT_MODES:
+        next_cursor = encode_cursor(list(page_rows[-1][0]))
+    return [name for _, name in page_rows], next_cursor
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+class HashingUploadFile:
+    """Upload target that streams a request file to disk and hashes it as it arrives
+
+    Werkzeug writes each multipart chunk here instead of buffering the file, so
+    memory use per upload stays constant. Once a file goes over its size limit
+    the rest of it is discarded rather than written.
+    """
+
+    def __init__(self, limit=None):
+        os.makedirs(INCOMING_FOLDER, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=INCOMING_FOLDER, suffix='.part', delete=False)
+        self.path = self._file.name
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.limit = limit
+        self.too_large = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.too_large:
+            return len(data)
+        if self.limit is not None and self.size > self.limit:
+            self.too_large = True
+            self._file.truncate(0)
+            return len(data)
+        self.sha256.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        # Reading, seeking etc. go to the underlying temporary file
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def store_as(self, file_path):
+        """Put the streamed file in the content store under file_path, returning (digest, duplicate)"""
+        self._file.close()
+        result = store_file(file_path, self.path, self.sha256.hexdigest())
+        self.path = None
+        PROCESSED_BYTES.inc(self.size, operation='upload')
+        return result
+
+    def detach(self):
+        """Close the streamed file and hand its path to the caller, who becomes responsible for removing it"""
+        self._file.close()
+        path, self.path = self.path, None
+        remember_file_digest(path, self.sha256.hexdigest())
+        PROCESSED_BYTES.inc(self.size, operation='upload')
+        return path
+
+    def close(self):
+        self._file.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+            self.path = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+class UploadRequest(Request):
+    """Request that streams uploaded files to disk through HashingUploadFile"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        limit = MAX_VIDEO_SIZE if get_extension(filename or '') in VIDEO_EXTENSIONS else None
+        return HashingUploadFile(limit)
+
+app.request_class = UploadRequest
+
+# Serializes linking names to blobs against removing blobs nothing links to
+_objects_lock = threading.Lock()
+
+def object_path(digest):
+    """Return the path of the stored blob for a SHA-256 digest"""
+    return os.path.join(OBJECTS_FOLDER, digest[:2], digest)
+
+def incoming_path():
+    """Return a fresh path in the incoming folder to write a file before storing it"""
+    os.makedirs(INCOMING_FOLDER, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=INCOMING_FOLDER, suffix='.part')
+    os.close(fd)
+    return path
+
+def _link_or_copy(src, dst):
+    """Hard-link src to dst, copying instead where links are not possible"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def store_file(file_path, source_path=None, digest=None):
+    """Keep one stored blob per content digest and make file_path a link to it
+
+    source_path is a finished file to take the content from (e.g. a streamed
+    upload) and is consumed; without it the file already at file_path is
+    stored. When a blob with the same digest exists, the new copy is dropped
+    instead of written. Returns (digest, duplicate).
+    """
+    source_path = source_path or file_path
+    if digest is None:
+        digest = file_digest(source_path)
+    blob_path = object_path(digest)
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+
+    with _objects_lock:
+        duplicate = os.path.exists(blob_path)
+        if duplicate:
+            if source_path != file_path:
+                os.remove(source_path)
+        elif source_path == file_path:
+            _link_or_copy(file_path, blob_path)
+        else:
+            shutil.move(source_path, blob_path)
+
+        if not (os.path.exists(file_path) and os.path.samefile(file_path, blob_path)):
+            # Note the blob a replaced name linked to, so it can go once nothing else uses it
+            old_blob = None
+            if os.path.exists(file_path):
+                old_stat = os.stat(file_path)
+                if old_stat.st_nlink > 1:
+                    old_blob = (object_path(file_digest(file_path)), old_stat.st_ino)
+
+            # Link next to the blob first, then swap it in so the name never goes missing
+            tmp_path = incoming_path()
+            os.remove(tmp_path)
+            _link_or_copy(blob_path, tmp_path)
+            try:
+                os.replace(tmp_path, file_path)
+            except OSError:
+                # Uploads live on another filesystem; fall back to a plain copy
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                shutil.move(tmp_path, file_path)
+
+            if old_blob and os.path.exists(old_blob[0]):
+                stat = os.stat(old_blob[0])
+                if stat.st_ino == old_blob[1] and stat.st_nlink == 1:
+                    os.remove(old_blob[0])
+
+    remember_file_digest(file_path, digest)
+    return digest, duplicate
+
+def remove_stored_file(file_path, digest=None):
+    """Remove a stored name, and its blob once no other name links to it"""
+    with _objects_lock:
+        if digest is None and os.stat(file_path).st_nlink > 1:
+            digest = file_digest(file_path)
+        os.remove(file_path)
+        if digest:
+            blob_path = object_path(digest)
+            if os.path.exists(blob_path) and os.stat(blob_path).st_nlink == 1:
+                os.remove(blob_path)
+
+def prune_objects():
+    """Remove every stored blob that no name links to any more"""
+    removed = 0
+    with _objects_lock:
+        for root, _, blobs in os.walk(OBJECTS_FOLDER):
+            for blob in blobs:
+                blob_path = os.path.join(root, blob)
+                if os.stat(blob_path).st_nlink == 1:
+                    os.remove(blob_path)
+                    removed += 1
+    return removed
+
+def remove_upload(filename):
+    """Delete a local upload together with its metadata and unreferenced blob"""
+    entry = load_metadata().get(filename) or {}
+    remove_stored_file(upload_path(filename), entry.get('sha256'))
+    remove_file_metadata(filename)
+
+class Base64JSONBody:
+    """Request body for a JSON object with one base64-encoded file field
+
+    The file is read and encoded chunk by chunk while the body is sent, instead
+    of holding the file and its base64 copy in memory. The length is computed
+    up front so the request still goes out with a Content-Length.
+    """
+
+    CHUNK_SIZE = 3 * 256 * 1024  # A multiple of 3, so chunks encode without padding
+
+    def __init__(self, file_path, field, fields):
+        self.file_path = file_path
+        head = json.dumps(fields)[:-1] + (', ' if fields else '')
+        self.prefix = (head + json.dumps(field) + ': "').encode('utf-8')
+        self.suffix = b'"}'
+        size = os.path.getsize(file_path)
+        self.length = len(self.prefix) + 4 * ((size + 2) // 3) + len(self.suffix)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        yield self.prefix
+        with open(self.file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                yield base64.b64encode(chunk)
+        yield self.suffix
+
+def github_configured():
+    """Check whether the GitHub repository settings have been filled in"""
+    return GITHUB_REPO != 'your-username/your-repo-name' and GITHUB_TOKEN != 'your-github-personal-access-token'
+
+# Shared keep-alive session for all GitHub calls, created on first use
+_github_session = None
+_github_session_lock = threading.Lock()
+
+def get_github_session():
+    """Return the pooled requests session used for GitHub calls"""
+    global _github_session
+    with _github_session_lock:
+        if _github_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=GITHUB_POOL_SIZE, pool_maxsize=GITHUB_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['Authorization'] = f'Bearer {GITHUB_TOKEN}'
+            _github_session = session
+        return _github_session
+
+def _github_retry_delay(response, attempt):
+    """Return seconds to wait before retrying a GitHub response, or None if it should not be retried"""
+    if response.status_code in (500, 502, 503, 504):
+        return min(2 ** attempt + random.random(), GITHUB_MAX_RETRY_WAIT)
+
+    if response.status_code in (403, 429):
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            reset = response.headers.get('X-RateLimit-Reset', '')
+            if reset.isdigit():
+                return max(int(reset) - time.time(), 0) + 1
+        if 'secondary rate limit' in response.text.lower():
+            return min(60 * 2 ** attempt, GITHUB_MAX_RETRY_WAIT)
+
+    return None
+
+def github_operation(path):
+    """Name the kind of GitHub call a path makes, without file names, e.g. 'contents' or 'git/trees'"""
+    if path.startswith(('http://', 'https://')):
+        return 'download'
+    parts = path.split('?', 1)[0].split('/')
+    return '/'.join(parts[:2]) if parts[0] == 'git' else parts[0]
+
+def github_request(method, path, raw=False, **kwargs):
+    """Call the GitHub API through the shared session, retrying transient failures
+
+    path is relative to the repository API URL (e.g. 'contents/uploads/x.png')
+    or a full URL such as a download_url. Server errors and rate limits are
+    retried with exponential backoff, honouring Retry-After and
+    X-RateLimit-Reset as long as the wait stays under GITHUB_MAX_RETRY_WAIT.
+    """
+    if path.startswith(('http://', 'https://')):
+        url = path
+    else:
+        url = f'{GITHUB_API_URL}/repos/{GITHUB_REPO}/{path}'
+
+    headers = {'Accept': 'application/vnd.github.v3.raw' if raw else 'application/vnd.github.v3+json'}
+    headers.update(kwargs.pop('headers', None) or {})
+    kwargs.setdefault('timeout', GITHUB_TIMEOUT)
+    session = get_github_session()
+    operation = github_operation(path)
+
+    for attempt in range(GITHUB_MAX_RETRIES + 1):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, headers=headers, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            GITHUB_REQUEST_SECONDS.observe(time.perf_counter() - started, method=method, operation=operation, status='error')
+            if attempt == GITHUB_MAX_RETRIES:
+                raise
+            delay = min(2 ** attempt + random.random(), GITHUB_MAX_RETRY_WAIT)
+        else:
+            GITHUB_REQUEST_SECONDS.observe(time.perf_counter() - started, method=method, operation=operation,
+                                           status=response.status_code)
+            if response.headers.get('X-RateLimit-Remaining', '').isdigit():
+                GITHUB_RATE_LIMIT_REMAINING.set(int(response.headers['X-RateLimit-Remaining']))
+            if response.headers.get('X-RateLimit-Reset', '').isdigit():
+                GITHUB_RATE_LIMIT_RESET.set(int(response.headers['X-RateLimit-Reset']))
+            delay = _github_retry_delay(response, attempt)
+            if delay is None or delay > GITHUB_MAX_RETRY_WAIT or attempt == GITHUB_MAX_RETRIES:
+                return response
+            response.close()
+
+        print(f"GitHub {method} {path} failed, retrying in {delay:.1f}s")
+        time.sleep(delay)
+
 def upload_to_github(file_path, filename):
     """Upload file to GitHub repository using GitHub API"""
-    if GITHUB_REPO == 'your-username/your-repo-name' or GITHUB_TOKEN == 'your-github-personal-access-token':
+    if not github_configured():
         return False  # Skip if not configured
 
     try:
-        # Read file content
-        with open(file_path, 'rb') as f:
-            file_content = f.read()
-
-        # Encode to base64
-        encoded_content = base64.b64encode(file_content).decode('utf-8')
+        # Identical content already on GitHub under this name needs no new commit
+        entry = (get_github_entries() or {}).get(filename)
+        if entry and entry.get('sha') == git_blob_sha(file_path):
+            return True
 
         # GitHub API URL
-        url = f'https://api.github.com/repos/{GITHUB_REPO}/contents/uploads/{filename}'
-
-        # Headers
-        headers = {
-            'Authorization': f'Bearer {GITHUB_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
+        path = f'contents/uploads/{filename}'
 
         # Check if file already exists
-        response = requests.get(url, headers=headers)
+        response = github_request('GET', path)
         sha = None
         if response.status_code == 200:
             sha = response.json()['sha']
 
-        # Prepare data for upload
+        # Prepare data for upload; the content is base64-encoded while it is sent
         data = {
             'message': f'Upload file: {filename}',
-            'content': encoded_content,
             'branch': GITHUB_BRANCH
         }
         if sha:
             data['sha'] = sha
 
         # Upload file
-        response = requests.put(url, headers=headers, json=data)
-
-        return response.status_code in [200, 201]
+        response = github_request('PUT', path, data=Base64JSONBody(file_path, 'content', data),
+                                  headers={'Content-Type': 'application/json'})
+
+        if response.status_code in [200, 201]:
+            content = response.json().get('content') or {}
+            update_github_listing(filename, {
+                'sha': content.get('sha'),
+                'size': content.get('size'),
+                'download_url': content.get('download_url')
+            })
+            return True
+        return False
 
     except Exception as e:
         print(f"GitHub upload error: {e}")
@@ -101,21 +1186,15 @@ def upload_to_github(file_path, filename):
 
 def delete_from_github(filename):
     """Delete file from GitHub repository using GitHub API"""
-    if GITHUB_REPO == 'your-username/your-repo-name' or GITHUB_TOKEN == 'your-github-personal-access-token':
+    if not github_configured():
         return False  # Skip if not configured
 
     try:
         # GitHub API URL
-        url = f'https://api.github.com/repos/{GITHUB_REPO}/contents/uploads/{filename}'
-
-        # Headers
-        headers = {
-            'Authorization': f'Bearer {GITHUB_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
+        path = f'contents/uploads/{filename}'
 
         # Get file SHA
-        response = requests.get(url, headers=headers)
+        response = github_request('GET', path)
         if response.status_code != 200:
             return False  # File doesn't exist on GitHub
 
@@ -129,155 +1208,1142 @@ def delete_from_github(filename):
         }
 
         # Delete file
-        response = requests.delete(url, headers=headers, json=data)
+        response = github_request('DELETE', path, json=data)
 
-        return response.status_code == 200
+        if response.status_code == 200:
+            update_github_listing(filename)
+            return True
+        return False
 
     except Exception as e:
         print(f"GitHub delete error: {e}")
         return False
 
-def get_github_files():
-    """Get list of files from GitHub repository"""
-    if GITHUB_REPO == 'your-username/your-repo-name' or GITHUB_TOKEN == 'your-github-personal-access-token':
-        return []
+def _cached_by_inode(cache, file_path, compute):
+    """Return compute(file_path), reused per inode while mtime and size are unchanged
+
+    Keying by inode lets every name linked to a stored blob share one entry.
+    """
+    stat = os.stat(file_path)
+    key = (stat.st_dev, stat.st_ino)
+    cached = cache.get(key)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    value = compute(file_path)
+    cache[key] = (stat.st_mtime_ns, stat.st_size, value)
+    return value
+
+_git_sha_cache = {}
+
+def _compute_git_blob_sha(file_path):
+    sha1 = hashlib.sha1(b'blob %d\0' % os.path.getsize(file_path))
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+def git_blob_sha(file_path):
+    """Return the SHA git gives a file's content as a blob, to compare with GitHub's listing"""
+    return _cached_by_inode(_git_sha_cache, file_path, _compute_git_blob_sha)
+
+_s3_etag_cache = {}
+
+def _compute_s3_etag(file_path):
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < S3_MULTIPART_THRESHOLD:
+            md5 = hashlib.md5(usedforsecurity=False)
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(chunk)
+            return md5.hexdigest()
+        # Multipart uploads get the MD5 of the parts' MD5s and the part count
+        parts = [hashlib.md5(chunk, usedforsecurity=False).digest()
+                 for chunk in iter(lambda: f.read(S3_MULTIPART_CHUNK_SIZE), b'')]
+    return f"{hashlib.md5(b''.join(parts), usedforsecurity=False).hexdigest()}-{len(parts)}"
+
+def s3_etag(file_path):
+    """Return the ETag an S3-compatible store reports for a file uploaded by S3Storage"""
+    return _cached_by_inode(_s3_etag_cache, file_path, _compute_s3_etag)
+
+def create_github_blob(file_path):
+    """Upload a file's content as a git blob and return its SHA"""
+    body = Base64JSONBody(file_path, 'content', {'encoding': 'base64'})
+    response = github_request('POST', 'git/blobs', data=body, headers={'Content-Type': 'application/json'})
+    if response.status_code != 201:
+        raise RuntimeError(f"Blob upload failed for {file_path}: {response.status_code}")
+    return response.json()['sha']
+
+def commit_files_to_github(files, deletions=(), message=None):
+    """Commit many uploads and deletions to GitHub as one commit using the Git Data API
+
+    files is a list of (file_path, filename) pairs and deletions a list of
+    filenames. Blobs are uploaded in parallel, then a single tree and commit
+    are created and the branch is moved to it. Content GitHub already has is
+    not uploaded again. Returns True on success.
+    """
+    if not github_configured():
+        return False
+    if not files and not deletions:
+        return True
 
     try:
-        # GitHub API URL for uploads folder
-        url = f'https://api.github.com/repos/{GITHUB_REPO}/contents/uploads'
+        github_files = get_github_entries() or {}
+        with ThreadPoolExecutor(max_workers=GITHUB_BLOB_WORKERS) as executor:
+            local_shas = list(executor.map(lambda item: git_blob_sha(item[0]), files))
+
+            # Files already on GitHub with the same content need no tree change
+            changed = [(item, sha) for item, sha in zip(files, local_shas)
+                       if (github_files.get(item[1]) or {}).get('sha') != sha]
+            files = [item for item, _ in changed]
+            blob_shas = [sha for _, sha in changed]
+            if not files and not deletions:
+                return True
+
+            # Upload each new blob once, in parallel; they are only referenced once the commit lands
+            known_shas = {entry.get('sha') for entry in github_files.values()}
+            missing = {sha: file_path for (file_path, _), sha in changed if sha not in known_shas}
+            list(executor.map(create_github_blob, missing.values()))
+
+        tree = [{'path': f'uploads/{filename}', 'mode': '100644', 'type': 'blob', 'sha': sha}
+                for (_, filename), sha in zip(files, blob_shas)]
+        tree += [{'path': f'uploads/{filename}', 'mode': '100644', 'type': 'blob', 'sha': None}
+                 for filename in deletions]
+
+        if message is None:
+            names = [filename for _, filename in files] + list(deletions)
+            message = f'Upload {len(files)} file(s), delete {len(deletions)} file(s)' if deletions else f'Upload {len(files)} file(s)'
+            if len(names) <= 5:
+                message += ': ' + ', '.join(names)
+
+        for attempt in range(3):
+            # Get the current head of the branch and its tree
+            response = github_request('GET', f'git/ref/heads/{GITHUB_BRANCH}')
+            if response.status_code != 200:
+                print(f"Failed to read branch {GITHUB_BRANCH}: {response.status_code}")
+                return False
+            head_sha = response.json()['object']['sha']
+
+            response = github_request('GET', f'git/commits/{head_sha}')
+            if response.status_code != 200:
+                print(f"Failed to read commit {head_sha}: {response.status_code}")
+                return False
+            base_tree = response.json()['tree']['sha']
+
+            # Create one tree and one commit for the whole batch
+            response = github_request('POST', 'git/trees', json={'base_tree': base_tree, 'tree': tree})
+            if response.status_code != 201:
+                print(f"Failed to create tree: {response.status_code}")
+                return False
+
+            response = github_request('POST', 'git/commits', json={
+                'message': message,
+                'tree': response.json()['sha'],
+                'parents': [head_sha]
+            })
+            if response.status_code != 201:
+                print(f"Failed to create commit: {response.status_code}")
+                return False
+
+            # Move the branch; 422 means it moved meanwhile, so rebuild on the new head
+            response = github_request('PATCH', f'git/refs/heads/{GITHUB_BRANCH}', json={'sha': response.json()['sha']})
+            if response.status_code == 200:
+                break
+            if response.status_code != 422:
+                print(f"Failed to update branch {GITHUB_BRANCH}: {response.status_code}")
+                return False
+        else:
+            print(f"Branch {GITHUB_BRANCH} kept moving, giving up on batch commit")
+            return False
 
-        # Headers
-        headers = {
-            'Authorization': f'Bearer {GITHUB_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
+        for (file_path, filename), sha in zip(files, blob_shas):
+            update_github_listing(filename, {'sha': sha, 'size': os.path.getsize(file_path), 'download_url': None})
+        for filename in deletions:
+            update_github_listing(filename)
+        return True
 
-        # Get list of files from GitHub
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            print(f"Failed to fetch GitHub files: {response.status_code}")
-            return []
+    except Exception as e:
+        print(f"GitHub batch commit error: {e}")
+        return False
 
-        github_files = response.json()
-        if not isinstance(github_files, list):
-            print("Unexpected GitHub response format")
-            return []
+# Cached listing of the GitHub uploads folder, shared by all requests
+_github_listing = {'entries': None, 'etag': None, 'fetched_at': 0.0}
+_github_listing_lock = threading.Lock()
 
-        # Extract file names
-        files = []
-        for item in github_files:
-            if item['type'] == 'file':
-                files.append(item['name'])
+def _list_uploads_subtree(root_sha):
+    """List the uploads folder's own tree, for repositories too big for one recursive listing"""
+    response = github_request('GET', f'git/trees/{root_sha}')
+    if response.status_code != 200:
+        return None
+    uploads = next((item for item in response.json()['tree']
+                    if item['path'] == 'uploads' and item['type'] == 'tree'), None)
+    if uploads is None:
+        return []
 
-        return files
+    response = github_request('GET', f"git/trees/{uploads['sha']}")
+    if response.status_code != 200:
+        return None
+    data = response.json()
+    if data.get('truncated'):
+        print("GitHub uploads tree is truncated; some files are missing from the listing")
+    return [dict(item, path=f"uploads/{item['path']}") for item in data['tree']]
+
+def get_github_entries(refresh=False):
+    """Get {filename: {'sha', 'size', 'download_url'}} for files in the GitHub repository
+
+    The whole branch is listed with one recursive Git Trees call, which has no
+    1,000-entry cap and returns every blob's SHA and size. The listing is cached
+    for GITHUB_LISTING_TTL seconds and then revalidated with If-None-Match, so an
+    unchanged branch costs a 304. refresh=True revalidates immediately and
+    returns None if GitHub cannot be reached.
+    """
+    if not github_configured():
+        return {}
+
+    with _github_listing_lock:
+        cached = _github_listing['entries']
+        now = time.monotonic()
+        if cached is not None and not refresh and now - _github_listing['fetched_at'] < GITHUB_LISTING_TTL:
+            return dict(cached)
+
+        # Serve the stale listing if GitHub cannot be reached, unless asked to refresh
+        fallback = None if refresh or cached is None else dict(cached)
 
-    except Exception as e:
-        print(f"GitHub files fetch error: {e}")
-        return []
+        try:
+            # Git Trees API URL for the whole branch
+            path = f'git/trees/{GITHUB_BRANCH}'
+
+            # Revalidate the cached listing instead of downloading it again
+            headers = {}
+            if cached is not None and _github_listing['etag']:
+                headers['If-None-Match'] = _github_listing['etag']
+
+            # Get list of files from GitHub
+            response = github_request('GET', path, params={'recursive': '1'}, headers=headers)
+            if response.status_code == 304:
+                _github_listing['fetched_at'] = now
+                return dict(cached)
+            if response.status_code == 404:
+                # Empty repository or branch not created yet
+                github_files = []
+            elif response.status_code != 200:
+                print(f"Failed to fetch GitHub files: {response.status_code}")
+                return fallback
+            else:
+                data = response.json()
+                github_files = data.get('tree')
+                if not isinstance(github_files, list):
+                    print("Unexpected GitHub response format")
+                    return fallback
+                if data.get('truncated'):
+                    # Over GitHub's recursive limit; list the uploads folder on its own instead
+                    github_files = _list_uploads_subtree(data['sha'])
+                    if github_files is None:
+                        print("Failed to fetch GitHub uploads tree")
+                        return fallback
+
+            # Extract file entries; uploads are stored flat, so nested folders are skipped
+            entries = {}
+            for item in github_files:
+                name = item['path'][len('uploads/'):] if item['path'].startswith('uploads/') else None
+                if item['type'] == 'blob' and name and '/' not in name:
+                    entries[name] = {
+                        'sha': item['sha'],
+                        'size': item.get('size'),
+                        'download_url': None
+                    }
 
-def sync_from_github():
-    """Sync files from GitHub repository to local folder"""
-    if GITHUB_REPO == 'your-username/your-repo-name' or GITHUB_TOKEN == 'your-github-personal-access-token':
-        return False, "GitHub not configured"
+            _github_listing['entries'] = entries
+            _github_listing['etag'] = response.headers.get('ETag')
+            _github_listing['fetched_at'] = now
+            return dict(entries)
+
+        except Exception as e:
+            print(f"GitHub files fetch error: {e}")
+            return fallback
+
+def update_github_listing(filename, entry=None):
+    """Apply a successful upload (entry) or deletion (None) to the cached GitHub listing"""
+    with _github_listing_lock:
+        entries = _github_listing['entries']
+        if entries is None:
+            return
+        if entry is None:
+            entries.pop(filename, None)
+        else:
+            entries[filename] = entry
 
+def get_github_files():
+    """Get the set of file names in remote storage"""
+    entries = remote_storage().list()
+    return set(entries) if entries else set()
+
+def upload_dir(filename):
+    """Return the folder an upload is kept in under UPLOAD_LAYOUT"""
+    if UPLOAD_LAYOUT == 'sharded':
+        return os.path.join(UPLOAD_SHARD_FOLDER, hashlib.sha256(filename.encode('utf-8')).hexdigest()[:2])
+    return UPLOAD_FOLDER
+
+def upload_path(filename):
+    """Return the local path of an upload; routes and GitHub only ever see the name"""
+    return os.path.join(upload_dir(filename), filename)
+
+def upload_shard_dirs():
+    """Return every shard folder of the sharded layout"""
+    return [os.path.join(UPLOAD_SHARD_FOLDER, f'{shard:02x}') for shard in range(256)]
+
+# Upload names per folder, each reused until that folder's mtime changes
+_local_listing = {}
+_local_listing_lock = threading.Lock()
+
+def _scan_upload_folder(folder):
+    """Return the upload names directly in folder, listing it again only when it has changed
+
+    Adding, removing or renaming an entry updates the folder's mtime, so while it
+    is unchanged a stat replaces the listing.
+    """
     try:
-        # GitHub API URL for uploads folder
-        url = f'https://api.github.com/repos/{GITHUB_REPO}/contents/uploads'
+        stat = os.stat(folder)
+    except FileNotFoundError:
+        return frozenset()
+    key = (stat.st_ino, stat.st_mtime_ns)
+    with _local_listing_lock:
+        cached = _local_listing.get(folder)
+        if cached and cached[0] == key and time.time() - stat.st_mtime > LOCAL_LISTING_RESCAN_WINDOW:
+            return cached[1]
+
+    # The folder is statted before it is listed, so a change in between is caught next time.
+    # Subfolders (converted/, the shards), metadata.json and temporary dotfiles are not uploads.
+    with os.scandir(folder) as entries:
+        files = frozenset(entry.name for entry in entries
+                          if entry.is_file() and not entry.name.startswith('.') and entry.path != METADATA_FILE)
+    with _local_listing_lock:
+        _local_listing[folder] = (key, files)
+    return files
+
+def list_local_files():
+    """Return the names of the local uploads under UPLOAD_LAYOUT"""
+    if UPLOAD_LAYOUT != 'sharded':
+        return _scan_upload_folder(UPLOAD_FOLDER)
+
+    # Rebuild the combined set only when one of the shards was listed again
+    shards = [_scan_upload_folder(folder) for folder in upload_shard_dirs()]
+    with _local_listing_lock:
+        cached = _local_listing.get(UPLOAD_SHARD_FOLDER)
+        if cached and all(old is new for old, new in zip(cached[0], shards)):
+            return cached[1]
+    files = frozenset().union(*shards)
+    with _local_listing_lock:
+        _local_listing[UPLOAD_SHARD_FOLDER] = (shards, files)
+    return files
+
+def migrate_upload_layout():
+    """Move local uploads into the folders UPLOAD_LAYOUT expects, returning (moved, skipped paths)
+
+    Files are renamed, so they keep their links into the content store, and
+    queued GitHub uploads are pointed at the new paths.
+    """
+    found = []
+    for folder in [UPLOAD_FOLDER] + upload_shard_dirs():
+        found.extend((filename, os.path.join(folder, filename)) for filename in _scan_upload_folder(folder))
+
+    moved = []
+    skipped = []
+    for filename, file_path in found:
+        target = upload_path(filename)
+        if file_path == target:
+            continue
+        if os.path.exists(target):
+            skipped.append(file_path)
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(file_path, target)
+        moved.append((file_path, target))
 
-        # Headers
-        headers = {
-            'Authorization': f'Bearer {GITHUB_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
+    # Shards emptied by a move back to the flat layout are removed
+    for folder in upload_shard_dirs() + [UPLOAD_SHARD_FOLDER]:
+        try:
+            os.rmdir(folder)
+        except OSError:
+            pass
 
-        # Get list of files from GitHub
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            return False, f"Failed to fetch GitHub files: {response.status_code}"
-
-        github_files = response.json()
-        if not isinstance(github_files, list):
-            return False, "Unexpected GitHub response format"
-
-        # Get local files
-        local_files = set(os.listdir(UPLOAD_FOLDER))
-
-        synced_count = 0
-        for item in github_files:
-            if item['type'] == 'file':
-                filename = item['name']
-                if filename not in local_files:
-                    # Download file from GitHub
-                    file_url = item['download_url']
-                    file_response = requests.get(file_url)
-                    if file_response.status_code == 200:
-                        file_path = os.path.join(UPLOAD_FOLDER, filename)
-                        with open(file_path, 'wb') as f:
-                            f.write(file_response.content)
-
-                        # Record sync timestamp
-                        metadata = load_metadata()
-                        metadata[filename] = {
-                            'upload_time': datetime.now(),
-                            'size': os.path.getsize(file_path)
-                        }
-                        save_metadata(metadata)
-
-                        synced_count += 1
-                        print(f"Synced file: {filename}")
+    if moved:
+        conn = _connect_jobs_db()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany("UPDATE github_jobs SET file_path = ? WHERE file_path = ? AND status IN ('pending', 'running')",
+                             [(target, file_path) for file_path, target in moved])
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+    return len(moved), skipped
+
+class StorageBackend:
+    """A place uploads are kept, addressed by file name
+
+    list() and stat() describe files as {'size', 'etag'}, where etag is the
+    backend's own content identifier. content_etag() computes the same value for
+    a local file, so sync can compare files without transferring them.
+    """
+    name = None
+
+    def configured(self):
+        """Check whether the backend's settings have been filled in"""
+        return True
+
+    def put(self, filename, file_path):
+        """Store the content of file_path under filename, returning True on success"""
+        raise NotImplementedError
+
+    def put_many(self, files, deletions=(), message=None):
+        """Store [(file_path, filename)] and delete filenames, returning True if all of it succeeded
+
+        message describes the change, for backends that record one.
+        """
+        results = [self.put(filename, file_path) for file_path, filename in files]
+        results += [self.delete(filename) for filename in deletions]
+        return all(results)
+
+    def get_stream(self, filename, start=0, end=None):
+        """Return an iterator over bytes [start, end) of a file, raising FileNotFoundError if it is missing"""
+        raise NotImplementedError
+
+    def delete(self, filename):
+        """Delete a file, returning True if it was deleted"""
+        raise NotImplementedError
+
+    def list(self, refresh=False):
+        """Return {filename: {'size', 'etag'}}, or None if the listing could not be fetched"""
+        raise NotImplementedError
+
+    def stat(self, filename):
+        """Return {'size', 'etag'} for a file, or None if it does not exist"""
+        return (self.list() or {}).get(filename)
+
+    def content_etag(self, file_path):
+        """Return the etag this backend would report for a local file's content"""
+        raise NotImplementedError
+
+def iter_file_range(f, start=0, end=None):
+    """Yield bytes [start, end) of an open file a chunk at a time, closing it at the end"""
+    with f:
+        f.seek(start)
+        remaining = None if end is None else end - start
+        while remaining is None or remaining > 0:
+            chunk = f.read(REMOTE_STREAM_CHUNK_SIZE if remaining is None else min(REMOTE_STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+class LocalStorage(StorageBackend):
+    """Uploads on local disk in UPLOAD_LAYOUT, deduplicated through the content store
+
+    This is the app's own copy of the uploads (LOCAL_STORAGE), not a choice for
+    REMOTE_STORAGE.
+    """
+    name = 'local'
+
+    def file_path(self, filename):
+        """Return the path of a local upload, or None if there is no such file"""
+        file_path = safe_join(upload_dir(filename), filename)
+        if not file_path or file_path == METADATA_FILE or not os.path.isfile(file_path):
+            return None
+        return file_path
+
+    def put(self, filename, file_path):
+        tmp_path = incoming_path()
+        shutil.copyfile(file_path, tmp_path)
+        digest, _ = store_file(upload_path(filename), tmp_path)
+        record_file_metadata(filename, upload_path(filename), digest)
+        return True
+
+    def get_stream(self, filename, start=0, end=None):
+        file_path = self.file_path(filename)
+        if file_path is None:
+            raise FileNotFoundError(f"{filename} is not stored locally")
+        return iter_file_range(open(file_path, 'rb'), start, end)
+
+    def delete(self, filename):
+        if self.file_path(filename) is None:
+            return False
+        # Removes the file, its metadata and its stored blob if nothing else uses it
+        remove_upload(filename)
+        return True
+
+    def list(self, refresh=False):
+        # Digests already recorded in the metadata are included; others are left to stat()
+        metadata = load_metadata()
+        files = {}
+        for filename in list_local_files():
+            try:
+                size = os.path.getsize(upload_path(filename))
+            except FileNotFoundError:
+                continue
+            files[filename] = {'size': size, 'etag': (metadata.get(filename) or {}).get('sha256')}
+        return files
+
+    def stat(self, filename):
+        file_path = self.file_path(filename)
+        if file_path is None:
+            return None
+        return {'size': os.path.getsize(file_path), 'etag': file_digest(file_path)}
+
+    def content_etag(self, file_path):
+        return file_digest(file_path)
+
+class GitHubStorage(StorageBackend):
+    """Uploads committed to the uploads/ folder of GITHUB_REPO, identified by git blob SHA"""
+    name = 'github'
+
+    def configured(self):
+        return github_configured()
+
+    def put(self, filename, file_path):
+        return upload_to_github(file_path, filename)
+
+    def put_many(self, files, deletions=(), message=None):
+        if not GITHUB_BATCH_COMMITS:
+            return super().put_many(files, deletions, message)
+        # Push everything in a single commit
+        return commit_files_to_github(files, deletions, message)
+
+    def get_stream(self, filename, start=0, end=None):
+        headers = {}
+        if start or end is not None:
+            headers['Range'] = f"bytes={start}-{'' if end is None else end - 1}"
+        response = github_request('GET', f'contents/uploads/{filename}', raw=True, stream=True, headers=headers)
+        if response.status_code not in (200, 206):
+            response.close()
+            raise FileNotFoundError(f"GitHub returned {response.status_code} for {filename}")
+        # GitHub may ignore the Range header and send the whole file, in which case skip to the range
+        return iter_github_body(response, start if response.status_code == 200 else 0,
+                                None if end is None else end - start)
+
+    def delete(self, filename):
+        return delete_from_github(filename)
+
+    def list(self, refresh=False):
+        entries = get_github_entries(refresh)
+        if entries is None:
+            return None
+        return {filename: {'size': entry.get('size'), 'etag': entry['sha']} for filename, entry in entries.items()}
+
+    def content_etag(self, file_path):
+        return git_blob_sha(file_path)
+
+class S3Storage(StorageBackend):
+    """Uploads as objects under S3_PREFIX in S3_BUCKET on an S3-compatible store
+
+    Files from S3_MULTIPART_THRESHOLD up go in parts of S3_MULTIPART_CHUNK_SIZE,
+    which content_etag() follows to reproduce the store's ETag. Pointing
+    S3_ENDPOINT_URL at MinIO or moto's server runs everything against a local
+    stand-in.
+    """
+    name = 's3'
+
+    def __init__(self):
+        self._client = None
+        self._listing = {'entries': None, 'fetched_at': 0.0}
+        self._lock = threading.Lock()
+
+    def configured(self):
+        return boto3 is not None and bool(S3_BUCKET)
+
+    def client(self):
+        """Return the shared S3 client, creating it on first use"""
+        if boto3 is None:
+            raise RuntimeError("REMOTE_STORAGE = 's3' needs the boto3 package")
+        with self._lock:
+            if self._client is None:
+                self._client = boto3.client('s3', endpoint_url=S3_ENDPOINT_URL, region_name=S3_REGION)
+            return self._client
+
+    def _update_listing(self, filename, entry=None):
+        with self._lock:
+            entries = self._listing['entries']
+            if entries is None:
+                return
+            if entry is None:
+                entries.pop(filename, None)
+            else:
+                entries[filename] = entry
+
+    def put(self, filename, file_path):
+        if not self.configured():
+            return False
+        try:
+            config = TransferConfig(multipart_threshold=S3_MULTIPART_THRESHOLD,
+                                    multipart_chunksize=S3_MULTIPART_CHUNK_SIZE)
+            self.client().upload_file(file_path, S3_BUCKET, S3_PREFIX + filename, Config=config)
+        except Exception as e:
+            print(f"S3 upload error for {filename}: {e}")
+            return False
+        self._update_listing(filename, {'size': os.path.getsize(file_path), 'etag': self.content_etag(file_path)})
+        return True
+
+    def get_stream(self, filename, start=0, end=None):
+        kwargs = {}
+        if start or end is not None:
+            kwargs['Range'] = f"bytes={start}-{'' if end is None else end - 1}"
+        try:
+            response = self.client().get_object(Bucket=S3_BUCKET, Key=S3_PREFIX + filename, **kwargs)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                raise FileNotFoundError(f"{filename} is not in the S3 bucket") from e
+            raise
+        return self._iter_body(response['Body'])
+
+    def _iter_body(self, body):
+        try:
+            yield from body.iter_chunks(REMOTE_STREAM_CHUNK_SIZE)
+        finally:
+            body.close()
+
+    def delete(self, filename):
+        if not self.configured():
+            return False
+        key = S3_PREFIX + filename
+        try:
+            # Deleting a missing key succeeds on S3, so check first to report it
+            self.client().head_object(Bucket=S3_BUCKET, Key=key)
+            self.client().delete_object(Bucket=S3_BUCKET, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                self._update_listing(filename)
+            else:
+                print(f"S3 delete error for {filename}: {e}")
+            return False
+        self._update_listing(filename)
+        return True
+
+    def list(self, refresh=False):
+        if not self.configured():
+            return {}
+
+        with self._lock:
+            cached = self._listing['entries']
+            if cached is not None and not refresh and time.monotonic() - self._listing['fetched_at'] < S3_LISTING_TTL:
+                return dict(cached)
+
+        try:
+            entries = {}
+            for page in self.client().get_paginator('list_objects_v2').paginate(Bucket=S3_BUCKET, Prefix=S3_PREFIX):
+                for item in page.get('Contents', []):
+                    # Uploads are stored flat, so keys in nested "folders" are skipped
+                    filename = item['Key'][len(S3_PREFIX):]
+                    if filename and '/' not in filename:
+                        entries[filename] = {'size': item['Size'], 'etag': item['ETag'].strip('"')}
+        except Exception as e:
+            print(f"S3 listing error: {e}")
+            # Serve the stale listing if the store cannot be reached, unless asked to refresh
+            return None if refresh or cached is None else dict(cached)
+
+        with self._lock:
+            self._listing.update(entries=entries, fetched_at=time.monotonic())
+        return dict(entries)
+
+    def content_etag(self, file_path):
+        return s3_etag(file_path)
+
+LOCAL_STORAGE = LocalStorage()
+STORAGE_BACKENDS = {'github': GitHubStorage(), 's3': S3Storage()}
+
+def remote_storage():
+    """Return the backend uploads are mirrored to, as set by REMOTE_STORAGE"""
+    return STORAGE_BACKENDS[REMOTE_STORAGE]
+
+def sync_manifest_path(storage):
+    """Return the sync manifest path for a backend; each one keeps its own etags"""
+    if storage.name == 'github':
+        return SYNC_MANIFEST
+    root, ext = os.path.splitext(SYNC_MANIFEST)
+    return f'{root}-{storage.name}{ext}'
+
+def load_sync_manifest(storage):
+    """Read the sync manifest: {filename: {'sha', 'mtime_ns', 'size', 'base'}}
+
+    sha is the backend etag of the local file as of mtime_ns and size (the git
+    blob SHA for GitHub), and base the etag both sides held after the last sync
+    of that file.
+    """
+    try:
+        with open(sync_manifest_path(storage), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_sync_manifest(storage, manifest):
+    """Write the sync manifest with an atomic write-then-rename"""
+    manifest_path = sync_manifest_path(storage)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(manifest_path), prefix='.sync-manifest-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def local_etags(storage, manifest):
+    """Return {filename: backend etag} for local uploads, rehashing only files whose mtime or size changed"""
+    etags = {}
+    for filename in list_local_files():
+        file_path = upload_path(filename)
+        if not os.path.isfile(file_path):
+            continue
+        stat = os.stat(file_path)
+        entry = manifest.setdefault(filename, {})
+        if entry.get('mtime_ns') != stat.st_mtime_ns or entry.get('size') != stat.st_size or not entry.get('sha'):
+            entry.update(sha=storage.content_etag(file_path), mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        etags[filename] = entry['sha']
+    return etags
+
+def _download_remote_file(filename):
+    """Stream one file from remote storage into the local store, returning its size or None on failure"""
+    try:
+        chunks = remote_storage().get_stream(filename)
+    except FileNotFoundError as e:
+        print(f"Failed to download {filename}: {e}")
+        return None
+
+    # Write the body to disk as it arrives, hashing it on the way for the content store
+    tmp_path = incoming_path()
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                sha256.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+    except:
+        os.remove(tmp_path)
+        raise
+    finally:
+        chunks.close()
+
+    PROCESSED_BYTES.inc(size, operation='remote_download')
+    file_path = upload_path(filename)
+    digest, _ = store_file(file_path, tmp_path, sha256.hexdigest())
+
+    # Record sync timestamp
+    record_file_metadata(filename, file_path, digest)
+    print(f"Synced file: {filename}")
+    return size
+
+# Progress of the latest sync's downloads, reported by /api/sync/progress
+_download_progress = {'total': 0, 'done': 0, 'failed': 0, 'bytes': 0}
+_download_progress_lock = threading.Lock()
+
+def download_remote_files(filenames, progress=None):
+    """Download files from remote storage concurrently, returning the filenames that arrived
+
+    At most GITHUB_DOWNLOAD_WORKERS downloads run at once, so a large sync is
+    limited by bandwidth rather than round trips without tripping rate limits.
+    progress is a dict to keep this batch's counts in, such as _download_progress
+    for a sync; other batches (e.g. a conversion's) keep their own.
+    """
+    if progress is None:
+        progress = {}
+    with _download_progress_lock:
+        progress.update(total=len(filenames), done=0, failed=0, bytes=0)
+
+    def fetch(filename):
+        try:
+            size = _download_remote_file(filename)
+        except Exception as e:
+            print(f"Failed to download {filename}: {e}")
+            size = None
+        with _download_progress_lock:
+            if size is None:
+                progress['failed'] += 1
+            else:
+                progress['done'] += 1
+                progress['bytes'] += size
+            print(f"Downloaded {progress['done']}/{progress['total']} files from remote storage")
+        return size is not None
+
+    with ThreadPoolExecutor(max_workers=GITHUB_DOWNLOAD_WORKERS) as executor:
+        results = list(executor.map(fetch, filenames))
+    return [filename for filename, ok in zip(filenames, results) if ok]
+
+# Only one sync runs at a time, so two syncs never update the manifest concurrently
+_sync_lock = threading.Lock()
+
+def sync_with_remote(pull=True, push=True):
+    """Transfer only files whose content differs between uploads/ and remote storage
+
+    Local and remote etags are compared with the base etag from the last sync:
+    the side that still holds the base is behind and receives the other side's
+    copy, and a file missing on one side is copied to it. Files changed on both
+    sides since the last sync are left alone and reported as conflicts. A file
+    that differs but has no base yet (it predates the manifest) is taken from
+    the side being synced from, the remote one when syncing both ways.
+    Returns (True, {'downloaded', 'pushed', 'conflicts'}) or (False, error).
+    """
+    storage = remote_storage()
+    if not storage.configured():
+        return False, "GitHub not configured" if storage.name == 'github' else f"{storage.name} storage not configured"
+
+    with _sync_lock:
+        try:
+            github_files = storage.list(refresh=True)
+            if github_files is None:
+                return False, f"Failed to fetch {storage.name} files"
+
+            manifest = load_sync_manifest(storage)
+            local_shas = local_etags(storage, manifest)
+
+            downloads, uploads, conflicts = [], [], []
+            for filename in sorted(set(local_shas) | set(github_files)):
+                local_sha = local_shas.get(filename)
+                remote_sha = (github_files.get(filename) or {}).get('etag')
+                base = manifest.get(filename, {}).get('base')
+                if local_sha == remote_sha:
+                    manifest[filename]['base'] = local_sha
+                elif local_sha is None or (local_sha == base and remote_sha is not None):
+                    downloads.append(filename)
+                elif remote_sha is None or remote_sha == base:
+                    uploads.append(filename)
+                elif base is None:
+                    (downloads if pull else uploads).append(filename)
+                else:
+                    conflicts.append(filename)
+
+            # Entries for files that are gone from both sides are dropped
+            for filename in list(manifest):
+                if filename not in local_shas and filename not in github_files:
+                    del manifest[filename]
+
+            downloaded = []
+            if pull and downloads:
+                downloaded = download_remote_files(downloads, _download_progress)
+                for filename in downloaded:
+                    stat = os.stat(upload_path(filename))
+                    sha = github_files[filename]['etag']
+                    manifest[filename] = {'sha': sha, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'base': sha}
+
+            pushed = []
+            if push and uploads:
+                files = [(upload_path(filename), filename) for filename in uploads]
+                if storage.name == 'github' and GITHUB_BATCH_COMMITS:
+                    # Push every changed file in a single commit
+                    if storage.put_many(files, message=f'Sync {len(files)} file(s) to GitHub'):
+                        pushed = list(uploads)
                     else:
-                        print(f"Failed to download {filename}: {file_response.status_code}")
+                        print("Batch commit to GitHub failed")
+                else:
+                    for file_path, filename in files:
+                        if storage.put(filename, file_path):
+                            pushed.append(filename)
+                            print(f"Synced file to {storage.name}: {filename}")
+                        else:
+                            print(f"Failed to sync {filename} to {storage.name}")
+                for filename in pushed:
+                    manifest[filename]['base'] = local_shas[filename]
+                    PROCESSED_BYTES.inc(manifest[filename]['size'], operation='remote_upload')
 
-        return True, f"Successfully synced {synced_count} files from GitHub"
+            save_sync_manifest(storage, manifest)
+            if push and uploads and not pushed:
+                return False, f"Push to {storage.name} failed"
+            return True, {'downloaded': downloaded, 'pushed': pushed, 'conflicts': conflicts}
 
-    except Exception as e:
-        print(f"GitHub sync error: {e}")
-        return False, str(e)
+        except Exception as e:
+            print(f"{storage.name} sync error: {e}")
+            return False, str(e)
+
+def describe_conflicts(conflicts):
+    """Describe files changed on both sides, for flash messages"""
+    names = ', '.join(conflicts[:5]) + (f' and {len(conflicts) - 5} more' if len(conflicts) > 5 else '')
+    return f"{len(conflicts)} file(s) changed both locally and on GitHub and were not synced: {names}"
+
+def sync_from_github():
+    """Sync files from GitHub repository to local folder"""
+    success, result = sync_with_remote(push=False)
+    if not success:
+        return False, result
+    message = f"Successfully synced {len(result['downloaded'])} files from GitHub"
+    if result['conflicts']:
+        message += f". {describe_conflicts(result['conflicts'])}"
+    return True, message
 
 def sync_to_github():
     """Sync local files to GitHub repository"""
-    if GITHUB_REPO == 'your-username/your-repo-name' or GITHUB_TOKEN == 'your-github-personal-access-token':
-        return False, "GitHub not configured"
+    success, result = sync_with_remote(pull=False)
+    if not success:
+        return False, result
+    message = f"Successfully synced {len(result['pushed'])} files to GitHub"
+    if result['conflicts']:
+        message += f". {describe_conflicts(result['conflicts'])}"
+    return True, message
+
+def _connect_jobs_db():
+    """Open the SQLite job queue database, creating the schema if needed"""
+    os.makedirs(os.path.dirname(JOBS_DB), exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS github_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            file_path TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt_at REAL NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_github_jobs_status ON github_jobs (status, next_attempt_at);
+        CREATE INDEX IF NOT EXISTS idx_github_jobs_filename ON github_jobs (filename, id);
+        CREATE TABLE IF NOT EXISTS conversion_jobs (
+            id TEXT PRIMARY KEY,
+            to_format TEXT NOT NULL,
+            preset TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS conversion_job_files (
+            job_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            result TEXT,
+            PRIMARY KEY (job_id, position)
+        );
+    ''')
+    # Databases created before conversion presets existed lack the column
+    if 'preset' not in {row[1] for row in conn.execute('PRAGMA table_info(conversion_jobs)')}:
+        conn.execute('ALTER TABLE conversion_jobs ADD COLUMN preset TEXT')
+    return conn
+
+def enqueue_github_job(action, filename, file_path=None):
+    """Queue an upload to or delete from remote storage to be run by the background workers
+
+    Returns the job id, or None if remote storage is not configured.
+    """
+    if not remote_storage().configured():
+        return None
 
+    now = time.time()
+    conn = _connect_jobs_db()
     try:
-        # Get GitHub files
-        github_files = get_github_files()
-        github_files_set = set(github_files)
-
-        # Get local files
-        local_files = os.listdir(UPLOAD_FOLDER)
-
-        synced_count = 0
-        for filename in local_files:
-            if filename not in github_files_set:
-                # Upload file to GitHub
-                file_path = os.path.join(UPLOAD_FOLDER, filename)
-                if os.path.exists(file_path):
-                    success = upload_to_github(file_path, filename)
-                    if success:
-                        synced_count += 1
-                        print(f"Synced file to GitHub: {filename}")
-                    else:
-                        print(f"Failed to sync {filename} to GitHub")
+        conn.execute('BEGIN IMMEDIATE')
+        # Fold into a job for the same file that has not started yet
+        row = conn.execute('''
+            SELECT id FROM github_jobs
+            WHERE filename = ? AND status = 'pending' AND attempts = 0
+            ORDER BY id DESC LIMIT 1
+        ''', (filename,)).fetchone()
+        if row:
+            job_id = row['id']
+            conn.execute('UPDATE github_jobs SET action = ?, file_path = ?, updated_at = ? WHERE id = ?',
+                         (action, file_path, now, job_id))
+        else:
+            job_id = conn.execute('''
+                INSERT INTO github_jobs (action, filename, file_path, next_attempt_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (action, filename, file_path, now, now, now)).lastrowid
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+
+    _github_jobs_wakeup.set()
+    return job_id
+
+def cancel_github_jobs(filename):
+    """Cancel queued jobs for a file, e.g. because it was deleted locally"""
+    conn = _connect_jobs_db()
+    try:
+        conn.execute("UPDATE github_jobs SET status = 'cancelled', updated_at = ? WHERE filename = ? AND status = 'pending'",
+                     (time.time(), filename))
+    finally:
+        conn.close()
+
+def get_github_job_status(filenames):
+    """Return {filename: {'action', 'status', 'attempts', 'last_error'}} for the latest job of each of filenames
+
+    Only the given files are looked up, so a page of the listing costs the
+    same however many files have ever been queued.
+    """
+    filenames = list(filenames)
+    status = {}
+    conn = _connect_jobs_db()
+    try:
+        for start in range(0, len(filenames), GITHUB_JOB_STATUS_BATCH):
+            batch = filenames[start:start + GITHUB_JOB_STATUS_BATCH]
+            placeholders = ', '.join('?' * len(batch))
+            rows = conn.execute(f'''
+                SELECT filename, action, status, attempts, last_error FROM github_jobs
+                WHERE id IN (SELECT MAX(id) FROM github_jobs WHERE filename IN ({placeholders}) GROUP BY filename)
+            ''', batch).fetchall()
+            status.update((row['filename'], dict(row)) for row in rows)
+    finally:
+        conn.close()
+    return status
+
+def _claim_github_jobs(limit=1):
+    """Atomically mark up to limit runnable jobs (for different files) as running and return them"""
+    now = time.time()
+    conn = _connect_jobs_db()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        # Requeue jobs left running by a worker that died, and forget old finished ones
+        conn.execute("UPDATE github_jobs SET status = 'pending' WHERE status = 'running' AND updated_at < ?",
+                     (now - GITHUB_JOB_STALE_AFTER,))
+        conn.execute("DELETE FROM github_jobs WHERE status IN ('done', 'cancelled') AND updated_at < ?",
+                     (now - 7 * 24 * 3600,))
+        # Jobs for the same file run in order, one at a time
+        jobs = conn.execute('''
+            SELECT * FROM github_jobs AS j
+            WHERE status = 'pending' AND next_attempt_at <= ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM github_jobs AS earlier
+                  WHERE earlier.filename = j.filename AND earlier.id < j.id
+                    AND earlier.status IN ('pending', 'running'))
+            ORDER BY id LIMIT ?
+        ''', (now, limit)).fetchall()
+        conn.executemany("UPDATE github_jobs SET status = 'running', updated_at = ? WHERE id = ?",
+                         [(now, job['id']) for job in jobs])
+        conn.execute('COMMIT')
+        return [dict(job) for job in jobs]
+    finally:
+        conn.close()
+
+def _finish_github_job(job, error=None):
+    """Mark a job done, or schedule a retry with backoff if it failed"""
+    now = time.time()
+    attempts = job['attempts'] + 1
+    if error is None:
+        status, next_attempt_at = 'done', now
+    elif attempts >= GITHUB_JOB_MAX_ATTEMPTS:
+        status, next_attempt_at = 'failed', now
+    else:
+        status, next_attempt_at = 'pending', now + GITHUB_JOB_RETRY_DELAY * 2 ** (attempts - 1)
 
-        return True, f"Successfully synced {synced_count} files to GitHub"
+    conn = _connect_jobs_db()
+    try:
+        conn.execute('''
+            UPDATE github_jobs SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?, updated_at = ?
+            WHERE id = ?
+        ''', (status, attempts, error, next_attempt_at, now, job['id']))
+    finally:
+        conn.close()
+
+def record_pushed_files(storage, files):
+    """Mark [(file_path, filename)] pushed by the job queue as in sync in the sync manifest"""
+    with _sync_lock:
+        manifest = load_sync_manifest(storage)
+        for file_path, filename in files:
+            if not os.path.exists(file_path):
+                continue
+            etag = storage.content_etag(file_path)
+            entry = manifest.setdefault(filename, {})
+            entry['base'] = etag
+            if file_path == upload_path(filename):
+                stat = os.stat(file_path)
+                entry.update(sha=etag, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        save_sync_manifest(storage, manifest)
+
+def run_github_job(job):
+    """Run a single queued job against remote storage, returning an error message or None on success"""
+    storage = remote_storage()
+    if job['action'] == 'upload':
+        if not os.path.exists(job['file_path']):
+            return None  # File was removed before it could be pushed; nothing to do
+        if not storage.put(job['filename'], job['file_path']):
+            return f'{storage.name} upload failed'
+        PROCESSED_BYTES.inc(os.path.getsize(job['file_path']), operation='remote_upload')
+        record_pushed_files(storage, [(job['file_path'], job['filename'])])
+    elif job['action'] == 'delete':
+        if not storage.delete(job['filename']) and job['filename'] in get_github_files():
+            return f'{storage.name} delete failed'
+    else:
+        return f"Unknown job action: {job['action']}"
+    return None
+
+def run_github_job_batch(jobs):
+    """Run several queued jobs together (a single commit on GitHub), returning an error message or None"""
+    storage = remote_storage()
+    remote_files = storage.list() or {}
+    files = [(job['file_path'], job['filename']) for job in jobs
+             if job['action'] == 'upload' and os.path.exists(job['file_path'])]
+    deletions = [job['filename'] for job in jobs
+                 if job['action'] == 'delete' and job['filename'] in remote_files]
+    if not storage.put_many(files, deletions):
+        return f'{storage.name} batch failed'
+    PROCESSED_BYTES.inc(sum(os.path.getsize(file_path) for file_path, _ in files), operation='remote_upload')
+    record_pushed_files(storage, files)
+    return None
+
+def _github_worker():
+    """Background loop that runs queued GitHub jobs"""
+    while True:
+        try:
+            jobs = _claim_github_jobs(GITHUB_BATCH_SIZE if GITHUB_BATCH_COMMITS else 1)
+        except Exception as e:
+            print(f"GitHub job queue error: {e}")
+            jobs = []
+
+        if not jobs:
+            if _github_jobs_wakeup.wait(GITHUB_JOB_POLL_INTERVAL) and GITHUB_BATCH_COMMITS:
+                # Let a multi-file upload finish queueing so it goes out as one commit
+                time.sleep(GITHUB_BATCH_WINDOW)
+            _github_jobs_wakeup.clear()
+            continue
 
-    except Exception as e:
-        print(f"GitHub sync to error: {e}")
-        return False, str(e)
+        try:
+            error = run_github_job_batch(jobs) if len(jobs) > 1 else run_github_job(jobs[0])
+        except Exception as e:
+            error = str(e)
+        for job in jobs:
+            if error:
+                print(f"GitHub job {job['id']} ({job['action']} {job['filename']}) failed: {error}")
+            try:
+                _finish_github_job(job, error)
+            except Exception as e:
+                # Left as running; the stale-job check requeues it
+                print(f"GitHub job queue error: {e}")
+
+_github_jobs_wakeup = threading.Event()
+# PID of the process the workers were started in; a forked server worker starts its own
+_github_workers_pid = None
+_github_workers_lock = threading.Lock()
+
+def start_github_workers():
+    """Start the background GitHub job workers for this process"""
+    global _github_workers_pid
+    with _github_workers_lock:
+        if _github_workers_pid == os.getpid():
+            return
+        _github_workers_pid = os.getpid()
+    for i in range(GITHUB_JOB_WORKERS):
+        threading.Thread(target=_github_worker, name=f'github-worker-{i}', daemon=True).start()
+
+@app.before_request
+def ensure_github_workers():
+    # Started by the first request rather than on import, so CLI commands, the
+    # reloader's parent and a preloading server master never run them
+    start_github_workers()
 
 @app.route('/')
 def home():
     return render_template('home.html')
 
-@app.route('/files')
-def index():
-    local_files = os.listdir(app.config['UPLOAD_FOLDER'])
-    github_files = get_github_files()
+def build_files_info():
+    """Combine local files, remote files and metadata into a file info dictionary"""
+    local_files = list_local_files()
+    github_files = remote_storage().list() or {}
     metadata = load_metadata()
 
     # Combine and deduplicate files
-    all_files = list(set(local_files + github_files))
+    all_files = local_files | set(github_files)
 
     # Create file info dictionary
     files_info = {}
@@ -290,46 +2356,70 @@ def index():
             'extension': file.rsplit('.', 1)[1].lower() if '.' in file else ''
         }
 
-        # Add metadata if available
+        # Add metadata if available, otherwise the size from the remote listing
         if file in metadata:
             file_info['upload_time'] = metadata[file].get('upload_time')
             file_info['size'] = metadata[file].get('size')
+        elif file in github_files:
+            file_info['size'] = github_files[file].get('size')
 
         files_info[file] = file_info
 
-    # Get sort parameter
-    sort_by = request.args.get('sort', 'time_newest')
+    return files_info
 
-    # Sort files based on the parameter
-    if sort_by == 'name_asc':
-        sorted_files = sorted(files_info.items(), key=lambda x: x[0].lower())
-    elif sort_by == 'name_desc':
-        sorted_files = sorted(files_info.items(), key=lambda x: x[0].lower(), reverse=True)
-    elif sort_by == 'time_newest':
-        sorted_files = sorted(files_info.items(),
-                            key=lambda x: x[1]['upload_time'] if x[1]['upload_time'] else datetime.min,
-                            reverse=True)
-    elif sort_by == 'time_oldest':
-        sorted_files = sorted(files_info.items(),
-                            key=lambda x: x[1]['upload_time'] if x[1]['upload_time'] else datetime.max)
-    elif sort_by == 'size_largest':
-        sorted_files = sorted(files_info.items(),
-                            key=lambda x: x[1]['size'] if x[1]['size'] else 0,
-                            reverse=True)
-    elif sort_by == 'size_smallest':
-        sorted_files = sorted(files_info.items(),
-                            key=lambda x: x[1]['size'] if x[1]['size'] else float('inf'))
-    elif sort_by == 'type_asc':
-        sorted_files = sorted(files_info.items(), key=lambda x: x[1]['extension'])
-    elif sort_by == 'type_desc':
-        sorted_files = sorted(files_info.items(), key=lambda x: x[1]['extension'], reverse=True)
-    else:
-        sorted_files = list(files_info.items())
+def get_page_args():
+    """Read sort and pagination parameters from the query string"""
+    sort_by = request.args.get('sort', 'time_newest')
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+    return sort_by, page, limit, cursor
 
-    # Convert back to dictionary
-    sorted_files_info = dict(sorted_files)
+@app.route('/files')
+def index():
+    files_info = build_files_info()
+
+    # Get sort and pagination parameters
+    sort_by, page, limit, cursor = get_page_args()
+
+    # Sort files and keep only the requested page
+    page_files, _ = paginate_files(files_info, sort_by, page=page, limit=limit, cursor=cursor)
+    page_files_info = {file: files_info[file] for file in page_files}
+    total_pages = max((len(files_info) + limit - 1) // limit, 1)
+    job_status = get_github_job_status(page_files_info)
+
+    return render_template('index.html', files_info=page_files_info, current_sort=sort_by,
+                           page=page, total_pages=total_pages, limit=limit,
+                           total_files=len(files_info), job_status=job_status)
+
+@app.route('/api/files')
+def api_files():
+    """JSON file listing with page/limit or cursor pagination"""
+    files_info = build_files_info()
+    sort_by, page, limit, cursor = get_page_args()
+    page_files, next_cursor = paginate_files(files_info, sort_by, page=page, limit=limit, cursor=cursor)
+    job_status = get_github_job_status(set(page_files))
+
+    def generate():
+        yield '{"sort": %s, "page": %d, "limit": %d, "total": %d, "files": [' % (
+            json.dumps(sort_by), page, limit, len(files_info))
+        for i, file in enumerate(page_files):
+            info = files_info[file]
+            entry = {
+                'name': file,
+                'local': info['local'],
+                'github': info['github'],
+                'upload_time': info['upload_time'].isoformat() if info['upload_time'] else None,
+                'size': info['size'],
+                'extension': info['extension'],
+                'github_job': job_status.get(file),
+                'preview_url': url_for('preview_file', filename=file),
+                'download_url': url_for('download_file', filename=file)
+            }
+            yield (', ' if i else '') + json.dumps(entry)
+        yield '], "next_cursor": %s}' % json.dumps(next_cursor)
 
-    return render_template('index.html', files_info=sorted_files_info, current_sort=sort_by)
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 @app.route('/upload', methods=['GET', 'POST'])
 def upload_file():
@@ -349,7 +2439,8 @@ def upload_file():
         return redirect(url_for('index'))
 
     uploaded_count = 0
-    github_uploaded_count = 0
+    duplicate_count = 0
+    github_queued_count = 0
 
     for file in files:
         if file.filename == '':
@@ -360,126 +2451,329 @@ def upload_file():
 
             # Check file size for videos (30MB max)
             file_ext = filename.rsplit('.', 1)[1].lower()
-            if file_ext in {'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv'}:
-                file.seek(0, os.SEEK_END)
-                file_size = file.tell()
-                file.seek(0)  # Reset file pointer
-                if file_size > 30 * 1024 * 1024:  # 30MB in bytes
+            if file_ext in VIDEO_EXTENSIONS:
+                # Measured while the upload streamed in
+                if file.stream.size > MAX_VIDEO_SIZE:
                     flash(f'Video file "{filename}" exceeds 30MB limit')
                     continue
 
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            # Already on disk and hashed; content that is stored already is linked instead of kept again
+            file_path = upload_path(filename)
+            digest, duplicate = file.stream.store_as(file_path)
+            if duplicate:
+                duplicate_count += 1
 
             # Record upload timestamp
-            metadata = load_metadata()
-            metadata[filename] = {
-                'upload_time': datetime.now(),
-                'size': os.path.getsize(file_path)
-            }
-            save_metadata(metadata)
+            record_file_metadata(filename, file_path, digest)
 
             uploaded_count += 1
 
-            # Upload to GitHub
-            github_success = upload_to_github(file_path, filename)
-            if github_success:
-                github_uploaded_count += 1
+            # Queue upload to GitHub
+            if enqueue_github_job('upload', filename, file_path):
+                github_queued_count += 1
 
     if uploaded_count > 0:
         flash(f'Successfully uploaded {uploaded_count} file(s)')
-        if github_uploaded_count > 0:
-            flash(f'{github_uploaded_count} file(s) also uploaded to GitHub repository')
-        elif github_uploaded_count < uploaded_count:
-            flash('Files uploaded locally, but some GitHub uploads failed (check configuration)')
+        if duplicate_count > 0:
+            flash(f'{duplicate_count} file(s) matched content already stored and were not saved again')
+        if github_queued_count > 0:
+            flash(f'{github_queued_count} file(s) queued for upload to GitHub repository')
+        else:
+            flash('Files uploaded locally, but GitHub is not configured')
     else:
         flash('No valid files were uploaded')
 
     return redirect(url_for('index'))
 
-def preview_github_file(filename):
-    """Preview file from GitHub repository"""
-    if GITHUB_REPO == 'your-username/your-repo-name' or GITHUB_TOKEN == 'your-github-personal-access-token':
-        return None
-
+def iter_github_body(response, skip, length=None):
+    """Yield length bytes (or the rest) of a streamed GitHub response after dropping its first skip bytes"""
     try:
-        # GitHub API URL for raw content
-        url = f'https://api.github.com/repos/{GITHUB_REPO}/contents/uploads/{filename}'
-
-        # Headers for raw content with authentication
-        headers = {
-            'Authorization': f'Bearer {GITHUB_TOKEN}',
-            'Accept': 'application/vnd.github.v3.raw'
-        }
-
-        # Get raw file content
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            return None
-
-        # Return file content with appropriate headers
-        from flask import Response
-        return Response(response.content, mimetype=response.headers.get('content-type', 'application/octet-stream'))
+        for chunk in response.iter_content(chunk_size=REMOTE_STREAM_CHUNK_SIZE):
+            if skip >= len(chunk):
+                skip -= len(chunk)
+                continue
+            chunk = chunk[skip:] if length is None else chunk[skip:skip + length]
+            skip = 0
+            yield chunk
+            if length is not None:
+                length -= len(chunk)
+                if length <= 0:
+                    break
+    finally:
+        response.close()
+
+def serve_remote_file(filename, as_attachment=False):
+    """Stream a file from remote storage with ETag and Range support, or return None
+
+    The ETag is the backend's etag from the cached listing, so a revalidation is
+    answered with a 304 without fetching anything, and only the requested byte
+    range is asked for. The body is passed on as it arrives instead of being buffered.
+    """
+    storage = remote_storage()
+    if not storage.configured():
+        return None
 
-    except Exception as e:
-        print(f"GitHub preview error: {e}")
+    entry = storage.stat(filename)
+    if entry is None:
         return None
 
-def download_github_file(filename):
-    """Download file from GitHub repository"""
-    if GITHUB_REPO == 'your-username/your-repo-name' or GITHUB_TOKEN == 'your-github-personal-access-token':
+    # Let Werkzeug answer If-None-Match and work out the Range before anything is fetched
+    size = entry.get('size') or 0
+    rv = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    if as_attachment:
+        rv.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    rv.set_etag(entry['etag'])
+    rv.cache_control.no_cache = True
+    rv.cache_control.max_age = 0
+    rv.cache_control.must_revalidate = True
+    rv.make_conditional(request, accept_ranges=True, complete_length=size)
+    if rv.status_code == 304:
+        return rv
+
+    start, stop = (rv.content_range.start, rv.content_range.stop) if rv.status_code == 206 else (0, size)
+    try:
+        rv.response = storage.get_stream(filename, start, stop)
+    except Exception as e:
+        print(f"Remote download error for {filename}: {e}")
         return None
+    rv.content_length = stop - start
+    return rv
+
+def send_upload(filename, as_attachment):
+    """Send a local upload, or stream it from remote storage, with Range, ETag and revalidation support
+
+    Local files get the same ETag as the remote listing, so a file that moves
+    between the two keeps validating. Browsers revalidate on every view
+    and get a 304 while the content is unchanged.
+    """
+    file_path = LOCAL_STORAGE.file_path(filename)
+    if file_path:
+        response = send_from_directory(upload_dir(filename), filename, as_attachment=as_attachment,
+                                       etag=remote_storage().content_etag(file_path), max_age=0, conditional=True)
+        response.cache_control.must_revalidate = True
+        return response
+
+    # Try to fetch from remote storage if not found locally
+    return serve_remote_file(filename, as_attachment)
+
+class ZipStream:
+    """Write-only, unseekable file object that collects zipfile output so it can be streamed
+
+    zipfile sees that it cannot seek and writes each entry's sizes and CRC in a
+    data descriptor after its contents, so no part of the archive is rewritten.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Return everything written since the last call"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def iter_file_chunks(filename, file_path):
+    """Yield a local file's contents, or a remote upload's when file_path is None, a chunk at a time"""
+    if file_path:
+        with open(file_path, 'rb') as f:
+            yield from iter(lambda: f.read(ZIP_CHUNK_SIZE), b'')
+        return
 
+    chunks = remote_storage().get_stream(filename)
     try:
-        # GitHub API URL for raw content
-        url = f'https://api.github.com/repos/{GITHUB_REPO}/contents/uploads/{filename}'
+        yield from chunks
+    finally:
+        chunks.close()
+
+def stream_zip(files):
+    """Yield a ZIP archive of [(filename, local path or None for remote storage, size, mtime)] while it is built
+
+    Only the chunk being written is held in memory. Files that cannot be read are
+    left out, since the response has already started by the time they are reached.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w') as archive:
+        for filename, file_path, size, mtime in files:
+            chunks = iter_file_chunks(filename, file_path)
+            try:
+                # Read the first chunk before writing the entry header so a missing file is skipped cleanly
+                try:
+                    first_chunk = next(chunks, b'')
+                except Exception as e:
+                    print(f"Leaving {filename} out of ZIP download: {e}")
+                    continue
 
-        # Headers for raw content with authentication
-        headers = {
-            'Authorization': f'Bearer {GITHUB_TOKEN}',
-            'Accept': 'application/vnd.github.v3.raw'
-        }
+                info = zipfile.ZipInfo(filename, date_time=time.localtime(mtime)[:6])
+                info.external_attr = 0o644 << 16
+                info.file_size = size or 0  # Lets zipfile decide whether the entry needs ZIP64
+                extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+                info.compress_type = zipfile.ZIP_STORED if extension in ZIP_STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+                with archive.open(info, 'w') as entry:
+                    entry.write(first_chunk)
+                    yield stream.drain()
+                    for chunk in chunks:
+                        entry.write(chunk)
+                        yield stream.drain()
+            finally:
+                chunks.close()
+    yield stream.drain()
+
+@app.route('/download_zip', methods=['GET', 'POST'])
+def download_zip():
+    """Stream a ZIP of selected files (files=...) or of a conversion job's outputs (job=...)"""
+    job_id = request.values.get('job')
+    files = []
+    if job_id:
+        conversion_job = get_conversion_job(job_id)
+        if conversion_job is None:
+            flash('Conversion job not found')
+            return redirect(url_for('convert'))
+
+        converted_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'converted')
+        for image in conversion_job['converted_images']:
+            file_path = os.path.join(converted_folder, image['filename'])
+            if os.path.isfile(file_path):
+                stat = os.stat(file_path)
+                files.append((image['filename'], file_path, stat.st_size, stat.st_mtime))
+        archive_name = f'converted-{job_id[:8]}.zip'
+        fallback = url_for('convert', job=job_id)
+    else:
+        remote_entries = None
+        for filename in dict.fromkeys(secure_filename(name) for name in request.values.getlist('files')):
+            if not filename:
+                continue
+            file_path = LOCAL_STORAGE.file_path(filename)
+            if file_path:
+                stat = os.stat(file_path)
+                files.append((filename, file_path, stat.st_size, stat.st_mtime))
+                continue
 
-        # Get raw file content
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            return None
+            # Files only in remote storage are streamed straight into the archive
+            if remote_entries is None:
+                remote_entries = remote_storage().list() or {}
+            if filename in remote_entries:
+                files.append((filename, None, remote_entries[filename].get('size'), time.time()))
+        archive_name = 'files.zip'
+        fallback = url_for('index')
 
-        # Return file content with appropriate headers for download
-        from flask import Response
-        return Response(response.content,
-                       mimetype=response.headers.get('content-type', 'application/octet-stream'),
-                       headers={"Content-Disposition": f"attachment; filename={filename}"})
+    if not files:
+        flash('No files to download')
+        return redirect(fallback)
 
-    except Exception as e:
-        print(f"GitHub download error: {e}")
-        return None
+    return Response(stream_with_context(stream_zip(files)), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{archive_name}"'})
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=True)
-    except FileNotFoundError:
-        # Try to fetch from GitHub if not found locally
-        result = download_github_file(filename)
-        if result is not None:
-            return result
-        else:
-            flash('File not found')
-            return redirect(url_for('index'))
+    result = send_upload(filename, as_attachment=True)
+    if result is not None:
+        return result
+    else:
+        flash('File not found')
+        return redirect(url_for('index'))
 
 @app.route('/preview/<filename>')
 def preview_file(filename):
+    result = send_upload(filename, as_attachment=False)
+    if result is not None:
+        return result
+    else:
+        flash('File not found')
+        return redirect(url_for('index'))
+
+# Content digests of local files, keyed by path and reused while mtime and size are unchanged
+_digest_cache = {}
+
+def remember_file_digest(file_path, digest):
+    """Cache a digest computed elsewhere (e.g. while the file was uploaded)"""
+    stat = os.stat(file_path)
+    _digest_cache[file_path] = (stat.st_mtime_ns, stat.st_size, digest)
+
+def file_digest(file_path):
+    """Return the SHA-256 hex digest of a file's content"""
+    stat = os.stat(file_path)
+    cached = _digest_cache.get(file_path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    digest = sha256.hexdigest()
+    _digest_cache[file_path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+def generate_thumbnail(file_path, size, digest):
+    """Create (or reuse) a cached thumbnail for an image and return its path"""
+    thumb_format, thumb_ext = ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+    thumb_path = os.path.join(THUMBNAIL_FOLDER, f'{digest}-{size}.{thumb_ext}')
+    if os.path.exists(thumb_path):
+        return thumb_path
+
+    os.makedirs(THUMBNAIL_FOLDER, exist_ok=True)
+    with Image.open(file_path) as image:
+        # Refuse oversized images before any pixel data is decoded
+        if image.width * image.height > IMAGE_MAX_PIXELS:
+            raise ValueError(f"{image.width}x{image.height} exceeds the {IMAGE_MAX_PIXELS} pixel limit")
+
+        # Let the JPEG decoder scale down while decoding instead of decoding full size
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if thumb_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if thumb_format == 'WEBP' and has_alpha else 'RGB')
+
+        # Write to a temporary file first so concurrent requests never see a partial thumbnail
+        fd, tmp_path = tempfile.mkstemp(dir=THUMBNAIL_FOLDER, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, thumb_format, quality=80)
+            os.replace(tmp_path, thumb_path)
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return thumb_path
+
+@app.route('/thumb/<filename>')
+def thumbnail(filename):
+    """Serve a resized thumbnail of a local image"""
+    size = request.args.get('size', THUMBNAIL_DEFAULT_SIZE, type=int)
+    if size not in THUMBNAIL_SIZES:
+        size = THUMBNAIL_DEFAULT_SIZE
+
+    file_path = LOCAL_STORAGE.file_path(filename)
+    if get_extension(filename) not in THUMBNAIL_EXTENSIONS or not file_path:
+        # No local image to shrink (e.g. GitHub-only files), fall back to the original
+        return redirect(url_for('preview_file', filename=filename))
+
     try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=False)
-    except FileNotFoundError:
-        # Try to fetch from GitHub if not found locally
-        result = preview_github_file(filename)
-        if result is not None:
-            return result
-        else:
-            flash('File not found')
-            return redirect(url_for('index'))
+        digest = file_digest(file_path)
+        etag = f'{digest}-{size}'
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        thumb_path = generate_thumbnail(file_path, size, digest)
+    except Exception as e:
+        print(f"Thumbnail error for {filename}: {e}")
+        return redirect(url_for('preview_file', filename=filename))
+
+    # Browsers revalidate on every view and get a 304 while the content is unchanged
+    response = send_file(thumb_path, etag=etag, max_age=0, conditional=True)
+    response.cache_control.must_revalidate = True
+    return response
 
 @app.route('/get_content/<filename>')
 def get_file_content(filename):
@@ -490,28 +2784,21 @@ def get_file_content(filename):
         return {'error': 'Not a text file'}, 400
 
     try:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read(1000)  # Read first 1000 characters
-                truncated = len(content) >= 1000
-                return {'content': content, 'truncated': truncated}
-        else:
-            # Try to get from GitHub
-            if GITHUB_REPO != 'your-username/your-repo-name' and GITHUB_TOKEN != 'your-github-personal-access-token':
-                try:
-                    url = f'https://api.github.com/repos/{GITHUB_REPO}/contents/uploads/{filename}'
-                    headers = {
-                        'Authorization': f'Bearer {GITHUB_TOKEN}',
-                        'Accept': 'application/vnd.github.v3.raw'
-                    }
-                    response = requests.get(url, headers=headers)
-                    if response.status_code == 200:
-                        content = response.text[:1000]  # First 1000 characters
-                        truncated = len(response.text) > 1000
-                        return {'content': content, 'truncated': truncated}
-                except:
-                    pass
+        # Local copy first, then remote storage; 4001 bytes hold at least 1000 characters
+        for storage in (LOCAL_STORAGE, remote_storage()):
+            if not storage.configured():
+                continue
+            try:
+                chunks = storage.get_stream(filename, 0, 4001)
+                data = b''.join(chunks).decode('utf-8', errors='ignore')
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                print(f"Failed to read {filename} from {storage.name}: {e}")
+                continue
+            content = data[:1000]  # First 1000 characters
+            truncated = len(data) > 1000
+            return {'content': content, 'truncated': truncated}
 
         return {'error': 'File not found'}, 404
     except Exception as e:
@@ -519,18 +2806,10 @@ def get_file_content(filename):
 
 @app.route('/delete/<filename>')
 def delete_file(filename):
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
-        # Remove metadata
-        metadata = load_metadata()
-        if filename in metadata:
-            del metadata[filename]
-            save_metadata(metadata)
-
+    if LOCAL_STORAGE.delete(filename):
         # Delete from GitHub (only if file exists on GitHub)
-        github_success = delete_from_github(filename)
+        cancel_github_jobs(filename)
+        github_success = remote_storage().delete(filename)
         if github_success:
             flash('File successfully deleted from local and GitHub repository')
         else:
@@ -547,68 +2826,43 @@ def delete_file(filename):
 @app.route('/sync')
 def sync_files():
     """Sync files bidirectionally between local and GitHub repository"""
-    # Sync from GitHub to local
-    success_from, message_from = sync_from_github()
-
-    # Sync from local to GitHub
-    success_to, message_to = sync_to_github()
-
-    if success_from and success_to:
-        flash(f'{message_from}. {message_to}')
-    elif success_from:
-        flash(f'{message_from}. Sync to GitHub failed: {message_to}')
-    elif success_to:
-        flash(f'Sync from GitHub failed: {message_from}. {message_to}')
+    # One listing and one pass: each changed file moves in whichever direction is behind
+    success, result = sync_with_remote()
+
+    if success:
+        flash(f"Successfully synced {len(result['downloaded'])} files from GitHub. "
+              f"Successfully synced {len(result['pushed'])} files to GitHub")
+        if result['conflicts']:
+            flash(describe_conflicts(result['conflicts']))
     else:
-        flash(f'Sync failed: {message_from}. {message_to}')
+        flash(f'Sync failed: {result}')
 
     return redirect(url_for('index'))
 
+@app.route('/api/sync/progress')
+def sync_progress():
+    """Report progress of the latest sync's downloads"""
+    with _download_progress_lock:
+        return dict(_download_progress)
+
 @app.route('/sync_file/<filename>')
 def sync_file(filename):
     """Sync a specific file from GitHub to local storage"""
-    if GITHUB_REPO == 'your-username/your-repo-name' or GITHUB_TOKEN == 'your-github-personal-access-token':
+    if not remote_storage().configured():
         flash('GitHub not configured')
         return redirect(url_for('index'))
 
     try:
-        # GitHub API URL for file content
-        url = f'https://api.github.com/repos/{GITHUB_REPO}/contents/uploads/{filename}'
-
-        # Headers
-        headers = {
-            'Authorization': f'Bearer {GITHUB_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-
-        # Get file info from GitHub
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
+        if remote_storage().stat(filename) is None:
             flash(f'File "{filename}" not found on GitHub')
             return redirect(url_for('index'))
 
-        file_info = response.json()
-        download_url = file_info['download_url']
-
-        # Download file content
-        file_response = requests.get(download_url)
-        if file_response.status_code != 200:
+        # Stream the file content into local storage, replacing any local copy
+        # without touching other names linked to it
+        if _download_remote_file(filename) is None:
             flash(f'Failed to download file "{filename}" from GitHub')
             return redirect(url_for('index'))
 
-        # Save file locally
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        with open(file_path, 'wb') as f:
-            f.write(file_response.content)
-
-        # Record sync timestamp
-        metadata = load_metadata()
-        metadata[filename] = {
-            'upload_time': datetime.now(),
-            'size': os.path.getsize(file_path)
-        }
-        save_metadata(metadata)
-
         flash(f'File "{filename}" successfully synced from GitHub to local storage')
         return redirect(url_for('index'))
 
@@ -620,16 +2874,16 @@ def sync_file(filename):
 @app.route('/sync_to_github/<filename>')
 def sync_to_github_file(filename):
     """Sync a specific file from local storage to GitHub repository"""
-    if GITHUB_REPO == 'your-username/your-repo-name' or GITHUB_TOKEN == 'your-github-personal-access-token':
+    if not remote_storage().configured():
         flash('GitHub not configured')
         return redirect(url_for('index'))
 
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
-    if not os.path.exists(file_path):
+    file_path = LOCAL_STORAGE.file_path(filename)
+    if not file_path:
         flash(f'File "{filename}" not found locally')
         return redirect(url_for('index'))
 
-    success = upload_to_github(file_path, filename)
+    success = remote_storage().put(filename, file_path)
     if success:
         flash(f'File "{filename}" successfully synced to GitHub repository')
     else:
@@ -650,16 +2904,7 @@ def sync_to_github_route():
 @app.route('/delete_local/<filename>')
 def delete_local(filename):
     """Delete file from local storage only"""
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
-        # Remove metadata
-        metadata = load_metadata()
-        if filename in metadata:
-            del metadata[filename]
-            save_metadata(metadata)
-
+    if LOCAL_STORAGE.delete(filename):
         flash(f'File "{filename}" successfully deleted from local storage')
     else:
         flash('File not found locally')
@@ -668,7 +2913,7 @@ def delete_local(filename):
 @app.route('/delete_github/<filename>')
 def delete_github(filename):
     """Delete file from GitHub repository only"""
-    github_success = delete_from_github(filename)
+    github_success = remote_storage().delete(filename)
     if github_success:
         flash(f'File "{filename}" successfully deleted from GitHub repository')
     else:
@@ -679,20 +2924,11 @@ def delete_github(filename):
 def delete_both(filename):
     """Delete file from both local storage and GitHub repository"""
     # Delete from local
-    local_deleted = False
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-        local_deleted = True
-
-        # Remove metadata
-        metadata = load_metadata()
-        if filename in metadata:
-            del metadata[filename]
-            save_metadata(metadata)
+    local_deleted = LOCAL_STORAGE.delete(filename)
 
     # Delete from GitHub
-    github_success = delete_from_github(filename)
+    cancel_github_jobs(filename)
+    github_success = remote_storage().delete(filename)
 
     if local_deleted and github_success:
         flash(f'File "{filename}" successfully deleted from both local storage and GitHub repository')
@@ -725,31 +2961,26 @@ def create_file():
         return redirect(url_for('index'))
 
     # Check if file already exists
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], full_filename)
+    file_path = upload_path(full_filename)
     if os.path.exists(file_path):
         flash(f'File "{full_filename}" already exists')
         return redirect(url_for('index'))
 
     try:
         # Create the file with content
-        with open(file_path, 'w', encoding='utf-8') as f:
+        tmp_path = incoming_path()
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             f.write(content)
+        digest, _ = store_file(file_path, tmp_path)
 
         # Record upload timestamp
-        metadata = load_metadata()
-        metadata[full_filename] = {
-            'upload_time': datetime.now(),
-            'size': os.path.getsize(file_path)
-        }
-        save_metadata(metadata)
-
-        # Upload to GitHub
-        github_success = upload_to_github(file_path, full_filename)
+        record_file_metadata(full_filename, file_path, digest)
 
-        if github_success:
-            flash(f'File "{full_filename}" created and uploaded successfully')
+        # Queue upload to GitHub
+        if enqueue_github_job('upload', full_filename, file_path):
+            flash(f'File "{full_filename}" created and queued for upload to GitHub')
         else:
-            flash(f'File "{full_filename}" created locally, but GitHub upload failed (check configuration)')
+            flash(f'File "{full_filename}" created locally, but GitHub is not configured')
 
     except Exception as e:
         flash(f'Error creating file: {str(e)}')
@@ -777,54 +3008,43 @@ def edit_file(filename):
 
     # Check if the new filename already exists (if different from original)
     if new_full_filename != filename:
-        new_file_path = os.path.join(app.config['UPLOAD_FOLDER'], new_full_filename)
+        new_file_path = upload_path(new_full_filename)
         if os.path.exists(new_file_path):
             flash(f'File "{new_full_filename}" already exists')
             return redirect(url_for('index'))
 
     try:
         # Check if original file exists
-        original_file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        original_file_path = upload_path(filename)
         if not os.path.exists(original_file_path):
             flash(f'Original file "{filename}" not found')
             return redirect(url_for('index'))
 
         # If filename changed, delete the old file from GitHub first
         if new_full_filename != filename:
-            delete_from_github(filename)
+            enqueue_github_job('delete', filename)
 
-        # Update the file with new content
-        new_file_path = os.path.join(app.config['UPLOAD_FOLDER'], new_full_filename)
-        with open(new_file_path, 'w', encoding='utf-8') as f:
+        # Update the file with new content; it is written beside the old one, since
+        # the old name may be a link shared with other files holding the same content
+        new_file_path = upload_path(new_full_filename)
+        tmp_path = incoming_path()
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             f.write(content)
+        digest, _ = store_file(new_file_path, tmp_path)
 
         # If filename changed, remove old file and metadata
         if new_full_filename != filename:
-            os.remove(original_file_path)
-            metadata = load_metadata()
-            if filename in metadata:
-                del metadata[filename]
-            metadata[new_full_filename] = {
-                'upload_time': datetime.now(),
-                'size': os.path.getsize(new_file_path)
-            }
-            save_metadata(metadata)
+            remove_upload(filename)
+            record_file_metadata(new_full_filename, new_file_path, digest)
         else:
             # Update metadata for existing file
-            metadata = load_metadata()
-            metadata[new_full_filename] = {
-                'upload_time': datetime.now(),
-                'size': os.path.getsize(new_file_path)
-            }
-            save_metadata(metadata)
-
-        # Upload to GitHub
-        github_success = upload_to_github(new_file_path, new_full_filename)
+            record_file_metadata(new_full_filename, new_file_path, digest)
 
-        if github_success:
-            flash(f'File "{new_full_filename}" updated and uploaded successfully')
+        # Queue upload to GitHub
+        if enqueue_github_job('upload', new_full_filename, new_file_path):
+            flash(f'File "{new_full_filename}" updated and queued for upload to GitHub')
         else:
-            flash(f'File "{new_full_filename}" updated locally, but GitHub upload failed (check configuration)')
+            flash(f'File "{new_full_filename}" updated locally, but GitHub is not configured')
 
     except Exception as e:
         flash(f'Error updating file: {str(e)}')
@@ -845,22 +3065,22 @@ def delete_all_files():
 
     if target in ['local', 'both']:
         # Delete all local files
-        local_files = os.listdir(app.config['UPLOAD_FOLDER'])
+        local_files = list_local_files()
         for filename in local_files:
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            file_path = upload_path(filename)
             if os.path.exists(file_path):
                 os.remove(file_path)
                 deleted_local_count += 1
 
-        # Clear metadata file
-        if os.path.exists(METADATA_FILE):
-            os.remove(METADATA_FILE)
+        # Clear metadata and the blobs the deleted files linked to
+        clear_metadata()
+        prune_objects()
 
     if target in ['github', 'both']:
         # Delete all GitHub files
         github_files = get_github_files()
         for filename in github_files:
-            github_success = delete_from_github(filename)
+            github_success = remote_storage().delete(filename)
             if github_success:
                 deleted_github_count += 1
             else:
@@ -884,34 +3104,407 @@ def delete_all_files():
 
     return redirect(url_for('index'))
 
-@app.route('/convert')
-def convert():
-    local_files = os.listdir(app.config['UPLOAD_FOLDER'])
-    github_files = get_github_files()
-    metadata = load_metadata()
+def encode_settings(to_format, preset=DEFAULT_CONVERSION_PRESET):
+    """Resolve a target format and preset into the plain settings a conversion worker needs"""
+    save_format, save_options = IMAGE_SAVE_FORMATS[to_format]
+    spec = CONVERSION_PRESETS[preset]
+    return {
+        'format': save_format,
+        'options': dict(save_options, **spec.get('formats', {}).get(save_format, {})),
+        'max_size': spec.get('max_size'),
+        'strip_metadata': spec.get('strip_metadata')
+    }
+
+def convert_image_file(source_path, filename, to_format, output_path, settings):
+    """Convert one image to to_format at output_path, returning the detected source format or None if skipped
+
+    Runs in a conversion worker process, so it only takes and returns plain values.
+    """
+    try:
+        # Open image with PIL to detect format
+        with Image.open(source_path) as image:
+            # Detect source format from PIL
+            detected_format = image.format.lower() if image.format else None
+
+            # If PIL can't detect format, try from filename extension
+            if not detected_format:
+                file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+                if file_ext in IMAGE_SAVE_FORMATS:
+                    detected_format = file_ext
+
+            # Skip if format not supported
+            if not detected_format or detected_format not in IMAGE_SAVE_FORMATS:
+                return None
+
+            # Skip if source and target formats are the same
+            if detected_format == to_format:
+                return None
+
+            # Refuse oversized images before any pixel data is decoded
+            if image.width * image.height > IMAGE_MAX_PIXELS:
+                print(f"Skipping {filename}: {image.width}x{image.height} exceeds the {IMAGE_MAX_PIXELS} pixel limit")
+                return None
+
+            # Work out the preset's output size up front so the decoder can scale down while decoding
+            target_size = None
+            max_size = settings['max_size']
+            if max_size and max(image.size) > max_size:
+                scale = max_size / max(image.size)
+                target_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+                # JPEG decodes straight to 1/2, 1/4 or 1/8 scale; other formats ignore the request
+                image.draft(image.mode, target_size)
+
+            converted = image
+            if target_size:
+                # Shrink by an integer factor with reduce() first, then finish with Lanczos
+                converted = image.resize(target_size, Image.LANCZOS, reducing_gap=2.0)
+
+            metadata = {}
+            if settings['strip_metadata']:
+                # Apply the EXIF orientation to the pixels before the EXIF data is dropped
+                converted = ImageOps.exif_transpose(converted)
+                for key in ('exif', 'icc_profile', 'xmp'):
+                    converted.info.pop(key, None)
+            elif settings['strip_metadata'] is False:
+                # Carry EXIF and the colour profile over to the output
+                for key in ('exif', 'icc_profile'):
+                    if image.info.get(key):
+                        metadata[key] = image.info[key]
+
+            # Convert to RGB if necessary (for JPEG), after downscaling so the copy is small
+            if to_format in ['jpg', 'jpeg'] and converted.mode in ('RGBA', 'LA', 'P'):
+                converted = converted.convert('RGB')
+
+            # Save converted image
+            converted.save(output_path, settings['format'], **settings['options'], **metadata)
+
+        return detected_format
 
-    # Combine and deduplicate files
-    all_files = list(set(local_files + github_files))
+    except Exception as e:
+        print(f"Error converting {filename}: {e}")
+        return None
 
-    # Create file info dictionary
-    files_info = {}
-    for file in all_files:
-        file_info = {
-            'local': file in local_files,
-            'github': file in github_files,
-            'upload_time': None,
-            'size': None,
-            'extension': file.rsplit('.', 1)[1].lower() if '.' in file else ''
-        }
+def timed_convert_image_file(source_path, filename, to_format, output_path, settings):
+    """Run convert_image_file, returning (source format or None, seconds it took)"""
+    started = time.perf_counter()
+    source_format = convert_image_file(source_path, filename, to_format, output_path, settings)
+    return source_format, time.perf_counter() - started
 
-        # Add metadata if available
-        if file in metadata:
-            file_info['upload_time'] = metadata[file].get('upload_time')
-            file_info['size'] = metadata[file].get('size')
+def conversion_cache_key(digest, to_format, settings):
+    """Return the cache key for converting content with this digest to to_format using encode_settings() output
 
-        files_info[file] = file_info
+    to_format is part of the key on its own: jpg and jpeg encode alike, but an
+    image already in one of them is only skipped when converting to that name.
+    """
+    return hashlib.sha256(json.dumps([digest, to_format, settings], sort_keys=True).encode('utf-8')).hexdigest()
+
+def conversion_cache_path(key):
+    """Return the path of the cached output for a conversion cache key"""
+    return os.path.join(CONVERSION_CACHE_FOLDER, key[:2], key)
+
+def load_cached_conversion(key):
+    """Return the source format of a cached conversion and mark it recently used, or None on a miss"""
+    entry_path = conversion_cache_path(key)
+    try:
+        with open(entry_path + '.json', 'r') as f:
+            source_format = json.load(f)['source_format']
+        os.utime(entry_path)
+        return source_format
+    except (OSError, ValueError, KeyError):
+        return None
+
+def store_cached_conversion(key, output_path, source_format):
+    """Move a finished conversion into the cache"""
+    entry_path = conversion_cache_path(key)
+    os.replace(output_path, entry_path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix='.part')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'source_format': source_format}, f)
+    os.replace(tmp_path, entry_path + '.json')
+
+def evict_conversion_cache():
+    """Remove least recently used conversions until the cache fits in CONVERSION_CACHE_BUDGET"""
+    entries = []
+    for root, _, names in os.walk(CONVERSION_CACHE_FOLDER):
+        for name in names:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            if name.endswith('.part'):
+                # Left behind by a worker that died mid-write
+                if time.time() - stat.st_mtime > 3600:
+                    os.remove(path)
+            elif not name.endswith('.json'):
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= CONVERSION_CACHE_BUDGET:
+            break
+        os.remove(path)
+        if os.path.exists(path + '.json'):
+            os.remove(path + '.json')
+        total -= size
+
+def publish_conversion(key, filename, to_format, source_format, converted_folder, source_size):
+    """Make a cached conversion available in converted_folder and return its converted_images entry
+
+    Outputs are named <stem>_converted.<format>; if a different image already
+    holds that name (e.g. another source with the same stem), the name gets a
+    short content key so neither overwrites the other.
+    """
+    entry_path = conversion_cache_path(key)
+    name_without_ext = filename.rsplit('.', 1)[0]
+    new_filename = f"{name_without_ext}_converted.{to_format}"
+    converted_path = os.path.join(converted_folder, new_filename)
+    if os.path.exists(converted_path) and file_digest(converted_path) != file_digest(entry_path):
+        new_filename = f"{name_without_ext}_{key[:8]}_converted.{to_format}"
+        converted_path = os.path.join(converted_folder, new_filename)
+
+    if not (os.path.exists(converted_path) and os.path.samefile(converted_path, entry_path)):
+        # Linked under a temporary name and renamed, so only finished files are served
+        tmp_path = os.path.join(converted_folder, f'.{new_filename}.{uuid.uuid4().hex}.part')
+        _link_or_copy(entry_path, tmp_path)
+        os.replace(tmp_path, converted_path)
+
+    output_size = os.path.getsize(entry_path)
+    return {
+        'filename': new_filename,
+        'original_name': filename,
+        'conversion': f"{source_format.upper()} → {to_format.upper()}",
+        'format_badge': to_format.upper(),
+        'source_size': source_size,
+        'output_size': output_size,
+        'bytes_saved': source_size - output_size
+    }
+
+# Worker processes for image conversion, started on first use and kept for later requests
+_conversion_pool = None
+_conversion_pool_lock = threading.Lock()
+
+def get_conversion_pool():
+    """Return the shared image conversion process pool"""
+    global _conversion_pool
+    with _conversion_pool_lock:
+        if _conversion_pool is None:
+            # Spawned rather than forked: this process runs threads whose locks a fork would copy
+            _conversion_pool = ProcessPoolExecutor(max_workers=CONVERSION_WORKERS,
+                                                   mp_context=multiprocessing.get_context('spawn'))
+        return _conversion_pool
+
+def convert_images(sources, to_format, converted_folder, on_result=None, preset=DEFAULT_CONVERSION_PRESET):
+    """Convert [(source_path, filename)] across all cores, returning results in the same order
+
+    Images converted before with the same settings are served from the
+    conversion cache without decoding them again. on_result(index, result) is
+    called as each image finishes, in completion order. If a worker dies (e.g.
+    out of memory), the unfinished images are retried one at a time in a fresh
+    pool and an image that brings it down again is skipped, so no image is
+    decoded in this process.
+    """
+    global _conversion_pool
+    settings = encode_settings(to_format, preset)
+    results = [None] * len(sources)
+    finished = set()
+
+    def finish(index, key, source_format):
+        path, filename = sources[index]
+        try:
+            if source_format:
+                results[index] = publish_conversion(key, filename, to_format, source_format, converted_folder,
+                                                    os.path.getsize(path))
+        except OSError as e:
+            print(f"Error publishing {filename}: {e}")
+        finished.add(index)
+        if on_result:
+            on_result(index, results[index])
+
+    def complete(index, key, output_path, result):
+        source_format, seconds = result
+        if source_format:
+            CONVERSION_SECONDS.observe(seconds, source_format=source_format, target_format=to_format)
+            PROCESSED_BYTES.inc(os.path.getsize(sources[index][0]), operation='conversion_input')
+            PROCESSED_BYTES.inc(os.path.getsize(output_path), operation='conversion_output')
+            store_cached_conversion(key, output_path, source_format)
+        elif os.path.exists(output_path):
+            os.remove(output_path)
+        finish(index, key, source_format)
+
+    # Serve cache hits straight away and convert the rest
+    pending = []
+    for index, (path, filename) in enumerate(sources):
+        key = conversion_cache_key(file_digest(path), to_format, settings)
+        source_format = load_cached_conversion(key)
+        if source_format:
+            finish(index, key, source_format)
+        else:
+            output_path = f'{conversion_cache_path(key)}.{uuid.uuid4().hex}.part'
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            pending.append((index, path, filename, key, output_path))
+
+    try:
+        futures = {}
+        try:
+            pool = get_conversion_pool()
+            futures = {pool.submit(timed_convert_image_file, path, filename, to_format, output_path, settings): (index, key, output_path)
+                       for index, path, filename, key, output_path in pending}
+            for future in as_completed(futures):
+                complete(*futures[future], future.result())
+        except BrokenProcessPool:
+            # A worker died; keep what finished before it did and start a fresh pool
+            with _conversion_pool_lock:
+                _conversion_pool = None
+            for future, (index, key, output_path) in futures.items():
+                if index not in finished and future.done() and not future.cancelled() and future.exception() is None:
+                    complete(index, key, output_path, future.result())
+            print("Image conversion pool failed, retrying the remaining images one at a time")
+
+            # One at a time, so the image that brings the pool down again is the one skipped
+            for index, path, filename, key, output_path in pending:
+                if index in finished:
+                    continue
+                try:
+                    result = get_conversion_pool().submit(timed_convert_image_file, path, filename, to_format,
+                                                          output_path, settings).result()
+                except BrokenProcessPool:
+                    with _conversion_pool_lock:
+                        _conversion_pool = None
+                    print(f"Skipping {filename}: the conversion worker died converting it")
+                    result = (None, 0.0)
+                complete(index, key, output_path, result)
+        return results
+    finally:
+        if pending:
+            evict_conversion_cache()
+
+def start_conversion_job(sources, to_format, converted_folder, downloads=None, cleanup=(), preset=DEFAULT_CONVERSION_PRESET):
+    """Record a conversion job and run it in the background, returning its ID
+
+    sources are (source_path, filename) pairs, downloads the names of remote
+    files to fetch first, and cleanup temporary files to remove once the job
+    is over. Progress is kept in the jobs database so any app process can
+    report it.
+    """
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    conn = _connect_jobs_db()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        # Forget jobs nobody has looked at for a week
+        conn.execute('DELETE FROM conversion_job_files WHERE job_id IN (SELECT id FROM conversion_jobs WHERE updated_at < ?)',
+                     (now - 7 * 24 * 3600,))
+        conn.execute('DELETE FROM conversion_jobs WHERE updated_at < ?', (now - 7 * 24 * 3600,))
+        conn.execute('INSERT INTO conversion_jobs (id, to_format, preset, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                     (job_id, to_format, preset, now, now))
+        conn.executemany('INSERT INTO conversion_job_files (job_id, position, filename) VALUES (?, ?, ?)',
+                         [(job_id, position, filename) for position, (_, filename) in enumerate(sources)])
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+
+    threading.Thread(target=_run_conversion_job, name=f'conversion-{job_id[:8]}', daemon=True,
+                     args=(job_id, sources, to_format, converted_folder, downloads, cleanup, preset)).start()
+    return job_id
+
+def _update_conversion_job(job_id, status=None, error=None, files=()):
+    """Record a job's status and/or (position, status, result) updates for its files"""
+    now = time.time()
+    conn = _connect_jobs_db()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany('UPDATE conversion_job_files SET status = ?, result = ? WHERE job_id = ? AND position = ?',
+                         [(file_status, json.dumps(result) if result else None, job_id, position)
+                          for position, file_status, result in files])
+        conn.execute('UPDATE conversion_jobs SET status = COALESCE(?, status), error = COALESCE(?, error), updated_at = ? WHERE id = ?',
+                     (status, error, now, job_id))
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+
+def _run_conversion_job(job_id, sources, to_format, converted_folder, downloads, cleanup, preset):
+    """Fetch and convert a job's images, recording each file's result as it finishes"""
+    try:
+        _update_conversion_job(job_id, 'running')
 
-    return render_template('convert.html', files_info=files_info)
+        # Fetch the images that only exist in remote storage, all at once, before converting
+        if downloads:
+            download_remote_files(downloads)
+
+        # Skip files not found locally that could not be fetched from GitHub
+        present = [position for position, (path, _) in enumerate(sources) if os.path.exists(path)]
+        missing = [position for position, (path, _) in enumerate(sources) if not os.path.exists(path)]
+        if missing:
+            _update_conversion_job(job_id, files=[(position, 'missing', None) for position in missing])
+
+        def record(index, result):
+            _update_conversion_job(job_id, files=[(present[index], 'converted' if result else 'skipped', result)])
+
+        convert_images([sources[position] for position in present], to_format, converted_folder, record, preset)
+        _update_conversion_job(job_id, 'done')
+
+    except Exception as e:
+        print(f"Conversion job {job_id} failed: {e}")
+        _update_conversion_job(job_id, 'failed', str(e))
+    finally:
+        for path in cleanup:
+            if os.path.exists(path):
+                os.remove(path)
+
+def get_conversion_job(job_id):
+    """Return a conversion job's status with per-file progress, or None if there is no such job"""
+    conn = _connect_jobs_db()
+    try:
+        job = conn.execute('SELECT * FROM conversion_jobs WHERE id = ?', (job_id,)).fetchone()
+        if job is None:
+            return None
+        files = conn.execute('SELECT filename, status, result FROM conversion_job_files WHERE job_id = ? ORDER BY position',
+                             (job_id,)).fetchall()
+    finally:
+        conn.close()
+
+    status, error = job['status'], job['error']
+    if status in ('queued', 'running') and time.time() - job['updated_at'] > CONVERSION_JOB_STALE_AFTER:
+        status, error = 'failed', 'Conversion was interrupted'
+
+    files = [{'filename': row['filename'], 'status': row['status'],
+              'result': json.loads(row['result']) if row['result'] else None} for row in files]
+    converted_images = [file['result'] for file in files if file['result']]
+    return {
+        'id': job['id'],
+        'status': status,
+        'error': error,
+        'to_format': job['to_format'],
+        'preset': job['preset'] or DEFAULT_CONVERSION_PRESET,
+        'total': len(files),
+        'finished': sum(1 for file in files if file['status'] != 'pending'),
+        'converted': len(converted_images),
+        'bytes_saved': sum(image.get('bytes_saved', 0) for image in converted_images),
+        'files': files,
+        'converted_images': converted_images
+    }
+
+@app.route('/convert')
+def convert():
+    files_info = build_files_info()
+
+    # Show the progress, then the results, of a conversion job
+    conversion_job = None
+    job_id = request.args.get('job')
+    if job_id:
+        conversion_job = get_conversion_job(job_id)
+        if conversion_job is None:
+            flash('Conversion job not found')
+
+    converted_images = conversion_job['converted_images'] if conversion_job else None
+    return render_template('convert.html', files_info=files_info, conversion_job=conversion_job,
+                           converted_images=converted_images, conversion_presets=CONVERSION_PRESETS)
+
+@app.route('/convert/jobs/<job_id>')
+def conversion_job_status(job_id):
+    """Report a conversion job's status and per-file progress as JSON"""
+    conversion_job = get_conversion_job(job_id)
+    if conversion_job is None:
+        return {'error': 'Conversion job not found'}, 404
+    return conversion_job
 
 @app.route('/convert_image', methods=['POST'])
 def convert_image():
@@ -922,6 +3515,7 @@ def convert_image():
 
     files = request.files.getlist('images')
     to_format = request.form.get('to_format', '').lower()
+    preset = request.form.get('preset', DEFAULT_CONVERSION_PRESET)
 
     if not files or all(file.filename == '' for file in files):
         flash('No image files selected')
@@ -932,115 +3526,35 @@ def convert_image():
         return redirect(url_for('convert'))
 
     # Validate target format
-    supported_formats = ['jpg', 'jpeg', 'png', 'bmp', 'tiff', 'webp', 'gif']
-    if to_format not in supported_formats:
+    if to_format not in IMAGE_SAVE_FORMATS:
         flash('Unsupported target format')
         return redirect(url_for('convert'))
 
+    if preset not in CONVERSION_PRESETS:
+        flash('Unknown conversion preset')
+        return redirect(url_for('convert'))
+
     # Create converted folder if it doesn't exist
     converted_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'converted')
     os.makedirs(converted_folder, exist_ok=True)
 
-    converted_images = []
-    converted_count = 0
-
+    # Streamed uploads are already on disk; the job takes them over so worker processes can read them
+    sources = []
     for file in files:
         if file.filename == '':
             continue
 
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-
-            try:
-                # Open image with PIL to detect format
-                image = Image.open(file)
-
-                # Detect source format from PIL
-                detected_format = image.format.lower() if image.format else None
-
-                # If PIL can't detect format, try from filename extension
-                if not detected_format:
-                    file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-                    if file_ext in supported_formats:
-                        detected_format = file_ext
-
-                # Skip if format not supported
-                if not detected_format or detected_format not in supported_formats:
-                    continue
-
-                # Skip if source and target formats are the same
-                if detected_format == to_format:
-                    continue
-
-                # Convert to RGB if necessary (for JPEG)
-                if to_format in ['jpg', 'jpeg'] and image.mode in ('RGBA', 'LA', 'P'):
-                    image = image.convert('RGB')
-
-                # Generate new filename
-                name_without_ext = filename.rsplit('.', 1)[0]
-                new_filename = f"{name_without_ext}_converted.{to_format}"
-                converted_path = os.path.join(converted_folder, new_filename)
-
-                # Save converted image
-                if to_format in ['jpg', 'jpeg']:
-                    image.save(converted_path, 'JPEG', quality=95)
-                elif to_format == 'png':
-                    image.save(converted_path, 'PNG')
-                elif to_format == 'bmp':
-                    image.save(converted_path, 'BMP')
-                elif to_format == 'tiff':
-                    image.save(converted_path, 'TIFF')
-                elif to_format == 'webp':
-                    image.save(converted_path, 'WEBP')
-                elif to_format == 'gif':
-                    image.save(converted_path, 'GIF')
-
-                converted_images.append({
-                    'filename': new_filename,
-                    'original_name': filename,
-                    'conversion': f"{detected_format.upper()} → {to_format.upper()}",
-                    'format_badge': to_format.upper()
-                })
-
-                converted_count += 1
-
-            except Exception as e:
-                print(f"Error converting {filename}: {e}")
-                continue
-
-    if converted_count > 0:
-        flash(f'Successfully converted {converted_count} image(s)')
-        # Get files_info for the template
-        local_files = os.listdir(app.config['UPLOAD_FOLDER'])
-        github_files = get_github_files()
-        metadata = load_metadata()
-
-        # Combine and deduplicate files
-        all_files = list(set(local_files + github_files))
-
-        # Create file info dictionary
-        files_info = {}
-        for file in all_files:
-            file_info = {
-                'local': file in local_files,
-                'github': file in github_files,
-                'upload_time': None,
-                'size': None,
-                'extension': file.rsplit('.', 1)[1].lower() if '.' in file else ''
-            }
+            sources.append((file.stream.detach(), secure_filename(file.filename)))
 
-            # Add metadata if available
-            if file in metadata:
-                file_info['upload_time'] = metadata[file].get('upload_time')
-                file_info['size'] = metadata[file].get('size')
-
-            files_info[file] = file_info
-
-        return render_template('convert.html', converted_images=converted_images, files_info=files_info)
-    else:
+    if not sources:
         flash('No images were successfully converted')
         return redirect(url_for('convert'))
 
+    # Convert in the background and let the page poll for progress
+    job_id = start_conversion_job(sources, to_format, converted_folder, cleanup=[path for path, _ in sources], preset=preset)
+    return redirect(url_for('convert', job=job_id))
+
 @app.route('/download_converted/<filename>')
 def download_converted(filename):
     """Download converted image"""
@@ -1054,7 +3568,7 @@ def download_converted(filename):
 @app.route('/upload_converted/<filename>')
 def upload_converted(filename):
     """Upload converted image to GitHub repository"""
-    if GITHUB_REPO == 'your-username/your-repo-name' or GITHUB_TOKEN == 'your-github-personal-access-token':
+    if not remote_storage().configured():
         flash('GitHub not configured')
         return redirect(url_for('convert'))
 
@@ -1065,11 +3579,8 @@ def upload_converted(filename):
         flash(f'Converted file "{filename}" not found')
         return redirect(url_for('convert'))
 
-    success = upload_to_github(file_path, filename)
-    if success:
-        flash(f'Converted file "{filename}" successfully uploaded to GitHub repository')
-    else:
-        flash(f'Failed to upload converted file "{filename}" to GitHub repository')
+    enqueue_github_job('upload', filename, file_path)
+    flash(f'Converted file "{filename}" queued for upload to GitHub repository')
 
     return redirect(url_for('convert'))
 
@@ -1078,6 +3589,7 @@ def convert_selected_images():
     """Convert selected uploaded images to specified format"""
     selected_images = request.form.getlist('selected_images')
     to_format = request.form.get('to_format', '').lower()
+    preset = request.form.get('preset', DEFAULT_CONVERSION_PRESET)
 
     if not selected_images:
         flash('No images selected')
@@ -1088,153 +3600,94 @@ def convert_selected_images():
         return redirect(url_for('convert'))
 
     # Validate target format
-    supported_formats = ['jpg', 'jpeg', 'png', 'bmp', 'tiff', 'webp', 'gif']
-    if to_format not in supported_formats:
+    if to_format not in IMAGE_SAVE_FORMATS:
         flash('Unsupported target format')
         return redirect(url_for('convert'))
 
-    # Create converted folder if it doesn't exist
-    converted_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'converted')
-    os.makedirs(converted_folder, exist_ok=True)
-
-    converted_images = []
-    converted_count = 0
-
-    for filename in selected_images:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
-        # Check if file exists locally
-        if not os.path.exists(file_path):
-            # Try to sync from GitHub if not found locally
-            if GITHUB_REPO != 'your-username/your-repo-name' and GITHUB_TOKEN != 'your-github-personal-access-token':
-                try:
-                    # GitHub API URL for file content
-                    url = f'https://api.github.com/repos/{GITHUB_REPO}/contents/uploads/{filename}'
-
-                    # Headers
-                    headers = {
-                        'Authorization': f'Bearer {GITHUB_TOKEN}',
-                        'Accept': 'application/vnd.github.v3+json'
-                    }
-
-                    # Get file info from GitHub
-                    response = requests.get(url, headers=headers)
-                    if response.status_code == 200:
-                        file_info = response.json()
-                        download_url = file_info['download_url']
-
-                        # Download file content
-                        file_response = requests.get(download_url)
-                        if file_response.status_code == 200:
-                            with open(file_path, 'wb') as f:
-                                f.write(file_response.content)
-
-                            # Record sync timestamp
-                            metadata = load_metadata()
-                            metadata[filename] = {
-                                'upload_time': datetime.now(),
-                                'size': os.path.getsize(file_path)
-                            }
-                            save_metadata(metadata)
-                        else:
-                            continue  # Skip if download failed
-                    else:
-                        continue  # Skip if not found on GitHub
-                except:
-                    continue  # Skip if sync failed
-            else:
-                continue  # Skip if not found locally and GitHub not configured
-
-        try:
-            # Open image with PIL to detect format
-            with open(file_path, 'rb') as f:
-                image = Image.open(f)
-
-                # Detect source format from PIL
-                detected_format = image.format.lower() if image.format else None
-
-                # If PIL can't detect format, try from filename extension
-                if not detected_format:
-                    file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-                    if file_ext in supported_formats:
-                        detected_format = file_ext
-
-                # Skip if format not supported
-                if not detected_format or detected_format not in supported_formats:
-                    continue
-
-                # Skip if source and target formats are the same
-                if detected_format == to_format:
-                    continue
-
-                # Convert to RGB if necessary (for JPEG)
-                if to_format in ['jpg', 'jpeg'] and image.mode in ('RGBA', 'LA', 'P'):
-                    image = image.convert('RGB')
-
-                # Generate new filename
-                name_without_ext = filename.rsplit('.', 1)[0]
-                new_filename = f"{name_without_ext}_converted.{to_format}"
-                converted_path = os.path.join(converted_folder, new_filename)
-
-                # Save converted image
-                if to_format in ['jpg', 'jpeg']:
-                    image.save(converted_path, 'JPEG', quality=95)
-                elif to_format == 'png':
-                    image.save(converted_path, 'PNG')
-                elif to_format == 'bmp':
-                    image.save(converted_path, 'BMP')
-                elif to_format == 'tiff':
-                    image.save(converted_path, 'TIFF')
-                elif to_format == 'webp':
-                    image.save(converted_path, 'WEBP')
-                elif to_format == 'gif':
-                    image.save(converted_path, 'GIF')
-
-                converted_images.append({
-                    'filename': new_filename,
-                    'original_name': filename,
-                    'conversion': f"{detected_format.upper()} → {to_format.upper()}",
-                    'format_badge': to_format.upper()
-                })
-
-                converted_count += 1
-
-        except Exception as e:
-            print(f"Error converting {filename}: {e}")
-            continue
-
-    if converted_count > 0:
-        flash(f'Successfully converted {converted_count} image(s)')
-        # Get files_info for the template
-        local_files = os.listdir(app.config['UPLOAD_FOLDER'])
-        github_files = get_github_files()
-        metadata = load_metadata()
-
-        # Combine and deduplicate files
-        all_files = list(set(local_files + github_files))
-
-        # Create file info dictionary
-        files_info = {}
-        for file in all_files:
-            file_info = {
-                'local': file in local_files,
-                'github': file in github_files,
-                'upload_time': None,
-                'size': None,
-                'extension': file.rsplit('.', 1)[1].lower() if '.' in file else ''
-            }
+    if preset not in CONVERSION_PRESETS:
+        flash('Unknown conversion preset')
+        return redirect(url_for('convert'))
 
-            # Add metadata if available
-            if file in metadata:
-                file_info['upload_time'] = metadata[file].get('upload_time')
-                file_info['size'] = metadata[file].get('size')
+    # Convert in the background and let the page poll for progress
+    job_id = start_selected_conversion(selected_images, to_format, preset)
+    return redirect(url_for('convert', job=job_id))
 
-            files_info[file] = file_info
+def start_selected_conversion(selected_images, to_format, preset):
+    """Start a conversion job for uploaded files by name, returning the job ID"""
+    converted_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'converted')
+    os.makedirs(converted_folder, exist_ok=True)
 
-        return render_template('convert.html', converted_images=converted_images, files_info=files_info)
-    else:
-        flash('No images were successfully converted')
-        return redirect(url_for('convert'))
+    # Images that only exist in remote storage are fetched by the job before converting
+    filenames = [filename for filename in (secure_filename(str(name)) for name in selected_images) if filename]
+    sources = [(upload_path(filename), filename) for filename in filenames]
+    missing = [filename for path, filename in sources if not os.path.exists(path)]
+    downloads = None
+    if missing and remote_storage().configured():
+        remote_files = remote_storage().list() or {}
+        downloads = [filename for filename in missing if filename in remote_files]
+
+    return start_conversion_job(sources, to_format, converted_folder, downloads=downloads, preset=preset)
+
+@app.route('/api/convert', methods=['POST'])
+def api_convert():
+    """Start a conversion job for uploaded files: {"files": [...], "format": "webp", "preset": "web"}"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {'error': 'Request body must be a JSON object'}, 400
+    selected_images = data.get('files') or []
+    to_format = str(data.get('format', '')).lower()
+    preset = str(data.get('preset', DEFAULT_CONVERSION_PRESET))
+
+    if not isinstance(selected_images, list) or not selected_images:
+        return {'error': 'No images selected'}, 400
+    if to_format not in IMAGE_SAVE_FORMATS:
+        return {'error': 'Unsupported target format'}, 400
+    if preset not in CONVERSION_PRESETS:
+        return {'error': 'Unknown conversion preset', 'presets': list(CONVERSION_PRESETS)}, 400
+
+    job_id = start_selected_conversion(selected_images, to_format, preset)
+    return {'job_id': job_id, 'status_url': url_for('conversion_job_status', job_id=job_id)}, 202
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_time(exc):
+    """Observe the request's latency, labelled by endpoint so URLs with file names share a series
+
+    Runs as a teardown so requests whose view raised are counted too, as 500s.
+    """
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+        status = g.pop('response_status', 500)
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint,
+                                     method=request.method, status=status)
+
+@app.route('/metrics')
+def metrics():
+    """Export request, GitHub, conversion and metadata metrics for Prometheus to scrape"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.cli.command('migrate-uploads')
+def migrate_uploads_command():
+    """Move existing uploads into the layout set by UPLOAD_LAYOUT"""
+    moved, skipped = migrate_upload_layout()
+    print(f"Moved {moved} uploads into the {UPLOAD_LAYOUT} layout")
+    for file_path in skipped:
+        print(f"Skipped {file_path}: a file with that name is already in place")
+
+@app.cli.command('import-metadata')
+def import_metadata_command():
+    """Import uploads/metadata.json into the SQLite metadata database"""
+    count = import_metadata_json()
+    print(f"Imported {count} metadata entries into {METADATA_DB}")
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,116 @@
+"""commit_files_to_github against a local stand-in for the GitHub Git Data API"""
+import base64
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app
+
+
+class GitHubStub:
+    """Just enough of the Git Data API for one branch, recording what it was sent"""
+
+    def __init__(self):
+        self.head = 'c0'
+        self.blobs = {}
+        self.trees = []
+        self.commits = {}
+        self.ref_updates = []
+        self.reject_ref_updates = 0  # PATCHes to answer with 422 after someone else moved the branch
+
+    def handle(self, method, path, body):
+        if method == 'GET' and path == f'git/ref/heads/{app.GITHUB_BRANCH}':
+            return 200, {'object': {'sha': self.head}}
+        if method == 'GET' and path.startswith('git/commits/'):
+            return 200, {'tree': {'sha': 'tree-of-' + path.rsplit('/', 1)[1]}}
+        if method == 'POST' and path == 'git/blobs':
+            data = base64.b64decode(body['content'])
+            sha = hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+            self.blobs[sha] = data
+            return 201, {'sha': sha}
+        if method == 'POST' and path == 'git/trees':
+            self.trees.append(body)
+            return 201, {'sha': f't{len(self.trees)}'}
+        if method == 'POST' and path == 'git/commits':
+            sha = f'c{len(self.commits) + 1}'
+            self.commits[sha] = body
+            return 201, {'sha': sha}
+        if method == 'PATCH' and path == f'git/refs/heads/{app.GITHUB_BRANCH}':
+            self.ref_updates.append(body['sha'])
+            if self.reject_ref_updates:
+                self.reject_ref_updates -= 1
+                self.head = 'c-elsewhere'
+                return 422, {'message': 'Update is not a fast forward'}
+            self.head = body['sha']
+            return 200, {}
+        return 404, {'message': 'Not Found'}
+
+
+@pytest.fixture
+def github(monkeypatch):
+    stub = GitHubStub()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _dispatch(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            path = re.sub(r'^/repos/[^/]+/[^/]+/', '', self.path.split('?', 1)[0])
+            status, payload = stub.handle(self.command, path, body)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PATCH = _dispatch
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(app, 'GITHUB_API_URL', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setattr(app, 'GITHUB_TOKEN', 'test')
+    monkeypatch.setattr(app, '_github_listing', {'entries': None, 'etag': None, 'fetched_at': 0.0})
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+def test_commits_uploads_and_deletions_at_once(github, tmp_path):
+    (tmp_path / 'a.txt').write_bytes(b'first file')
+    (tmp_path / 'b.txt').write_bytes(b'second file')
+    files = [(str(tmp_path / 'a.txt'), 'a.txt'), (str(tmp_path / 'b.txt'), 'b.txt')]
+
+    assert app.commit_files_to_github(files, deletions=['old.txt'])
+
+    assert sorted(github.blobs.values()) == [b'first file', b'second file']
+    assert len(github.trees) == 1 and len(github.commits) == 1
+    tree = github.trees[0]
+    assert tree['base_tree'] == 'tree-of-c0'
+    assert {entry['path']: entry['sha'] for entry in tree['tree']} == {
+        'uploads/a.txt': app.git_blob_sha(str(tmp_path / 'a.txt')),
+        'uploads/b.txt': app.git_blob_sha(str(tmp_path / 'b.txt')),
+        'uploads/old.txt': None,
+    }
+    assert github.commits['c1']['parents'] == ['c0']
+    assert github.ref_updates == ['c1'] and github.head == 'c1'
+
+
+def test_rebuilds_on_the_new_head_when_the_branch_moved(github, tmp_path):
+    (tmp_path / 'a.txt').write_bytes(b'content')
+    github.reject_ref_updates = 1
+
+    assert app.commit_files_to_github([(str(tmp_path / 'a.txt'), 'a.txt')])
+
+    # Blobs go up once; the tree and commit are rebuilt on the branch's new head
+    assert list(github.blobs.values()) == [b'content']
+    assert len(github.trees) == 2
+    assert github.trees[1]['base_tree'] == 'tree-of-c-elsewhere'
+    assert github.commits['c2']['parents'] == ['c-elsewhere']
+    assert github.ref_updates == ['c1', 'c2'] and github.head == 'c2'
@@ -0,0 +1,72 @@
+"""S3Storage against moto's in-memory S3; install requirements-dev.txt to run it"""
+import os
+
+import pytest
+
+pytest.importorskip('boto3')
+moto = pytest.importorskip('moto')
+
+import app
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    for name, value in {'AWS_ACCESS_KEY_ID': 'test', 'AWS_SECRET_ACCESS_KEY': 'test',
+                        'AWS_DEFAULT_REGION': 'us-east-1'}.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(app, 'S3_BUCKET', 'uploads-test')
+    monkeypatch.setattr(app, 'S3_ENDPOINT_URL', None)
+    monkeypatch.setattr(app, 'S3_REGION', 'us-east-1')
+    # S3 parts are at least 5MB, so keep the test files small with the smallest allowed parts
+    monkeypatch.setattr(app, 'S3_MULTIPART_THRESHOLD', 5 * MB)
+    monkeypatch.setattr(app, 'S3_MULTIPART_CHUNK_SIZE', 5 * MB)
+    with moto.mock_aws():
+        storage = app.S3Storage()
+        storage.client().create_bucket(Bucket='uploads-test')
+        yield storage
+
+
+def write_file(path, size):
+    data = os.urandom(size)
+    path.write_bytes(data)
+    return str(path), data
+
+
+def test_put_list_and_etags(storage, tmp_path):
+    small_path, _ = write_file(tmp_path / 'small.txt', 1000)
+    large_path, _ = write_file(tmp_path / 'large.bin', 11 * MB)
+
+    assert storage.put('small.txt', small_path)
+    assert storage.put('large.bin', large_path)
+
+    listing = storage.list(refresh=True)
+    assert set(listing) == {'small.txt', 'large.bin'}
+    assert listing['small.txt']['size'] == 1000
+    assert listing['large.bin']['size'] == 11 * MB
+    assert listing['small.txt']['etag'] == storage.content_etag(small_path)
+    # Above the threshold the upload goes in three parts and the ETag says so
+    assert listing['large.bin']['etag'] == storage.content_etag(large_path)
+    assert listing['large.bin']['etag'].endswith('-3')
+
+
+def test_get_stream_ranges(storage, tmp_path):
+    file_path, data = write_file(tmp_path / 'large.bin', 6 * MB)
+    storage.put('large.bin', file_path)
+
+    assert b''.join(storage.get_stream('large.bin')) == data
+    assert b''.join(storage.get_stream('large.bin', 100, 200)) == data[100:200]
+    assert b''.join(storage.get_stream('large.bin', 6 * MB - 10)) == data[-10:]
+    with pytest.raises(FileNotFoundError):
+        storage.get_stream('missing.bin')
+
+
+def test_delete(storage, tmp_path):
+    file_path, _ = write_file(tmp_path / 'a.txt', 10)
+    storage.put('a.txt', file_path)
+
+    assert storage.delete('a.txt')
+    assert not storage.delete('a.txt')
+    assert storage.list(refresh=True) == {}
+    assert storage.stat('a.txt') is None